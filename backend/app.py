@@ -1,22 +1,49 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from database import get_db
-from llama_sql_agent import generate_sql_query, is_generic_message
+from llama_sql_agent import (
+    generate_sql_query, draft_sql_query, classify_locally, classify_with_llm,
+    semantic_sql_cache, embedding_cache, get_client, load_indexes
+)
+from database import check_connection, get_table_metadata, db_config
+from intent_classifier import local_classifier
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
 import io
-import base64
+import json
+import os
+import asyncio
+import importlib.util
 import logging
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict, Any
-from rich.console import Console
-from rich.table import Table  
 import time
 from pydantic import BaseModel
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from result_cache import cache_from_env, make_cache_key
+from streaming import stream_ndjson
+from schema_service import schema_registry
+from connection_registry import connection_registry
+from columnar import stream_columnar, pyarrow_installed, load_pyarrow, COLUMNAR_MEDIA_TYPES
+from workers import run_blocking, shutdown_pools
+from charts import CHART_FORMATS, CHART_RENDER_DEFAULT, CHART_RENDER_MODES, build_chart_spec
+from chart_renderer import chart_renderer, chart_style
+from decoding import column_kinds, decode_frame, frame_records
+from instrumentation import (
+    metrics, span, timed_stage, record_stage, start_request_timings, current_timings, server_timing_header,
+    summarize_result, truncate
+)
+from query_guard import dialect_name, query_guard, QueryRejectedError
+from result_store import result_store, InvalidCursorError, RESULT_PAGE_SIZE
+from text_format import format_text, stream_text
+from downsampling import (
+    CHART_PUSHDOWN, chart_budget, chart_count_probe, label_other_rows, pushdown_chart_reduction, reduce_for_chart,
+)
+from schema_pruning import estimate_tokens
+from warmup import readiness, WARMUP_MODE
+from singleflight import query_flights, SINGLE_FLIGHT
+from semantic_cache import normalize_question
 
 # Add this new model for database connection
 class DatabaseConnection(BaseModel):
@@ -27,26 +54,62 @@ class DatabaseConnection(BaseModel):
     db_user: str
     db_password: str
 
-query_cache = {}  # Dictionary to store cached query results
-CACHE_TTL = 5000  # 30 minutes cache expiration
+# Bounded LRU+TTL cache for executed query results (RESULT_CACHE_MAX_BYTES / RESULT_CACHE_TTL)
+result_cache = cache_from_env("RESULT_CACHE")
 
-# Ensure Matplotlib works in FastAPI without GUI issues
-import matplotlib
-matplotlib.use("Agg")
+# Start SQL generation alongside generic-message classification instead of after it
+SPECULATIVE_SQL = os.getenv("SPECULATIVE_SQL", "true").lower() in ("1", "true", "yes")
 pd.set_option('display.float_format', '{:.2f}'.format)
 
 # Initialize logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Check if 'tabulate' is installed for table formatting
-try:
-    from tabulate import tabulate
-    tabulate_installed = True
-except ImportError:
-    tabulate_installed = False
-
-app = FastAPI()
+# Check if 'tabulate' is installed for table formatting (without importing it)
+tabulate_installed = importlib.util.find_spec("tabulate") is not None
+
+
+def warmup_steps():
+    """Everything deferred at import time, in the order warm-up loads it."""
+    steps = [
+        ("embedding_indexes", load_indexes),
+        ("semantic_cache", semantic_sql_cache.ensure_loaded),
+        ("embedding_cache", embedding_cache.ensure_ready),
+        ("openai_client", get_client),
+        ("tokenizer", lambda: estimate_tokens("warm-up")),
+    ]
+    if db_config["db_name"]:
+        steps.append(("database", check_connection))
+        steps.append(("schema", get_table_metadata))
+    if pyarrow_installed:
+        steps.append(("pyarrow", load_pyarrow))
+    return steps
+
+
+@asynccontextmanager
+async def lifespan(app):
+    result_cache.start_sweeper()
+    connection_registry.start_evictor()
+    result_store.cache.start_sweeper()
+    chart_renderer.cache.start_sweeper()
+    if WARMUP_MODE == "blocking":
+        # Off the event loop, but startup still waits for it
+        await asyncio.to_thread(readiness.start, warmup_steps(), WARMUP_MODE)
+    else:
+        readiness.start(warmup_steps(), WARMUP_MODE)
+    yield
+    result_cache.stop_sweeper()
+    chart_renderer.cache.stop_sweeper()
+    result_store.cache.stop_sweeper()
+    chart_renderer.shutdown()
+    schema_registry.stop_all()
+    connection_registry.stop_evictor()
+    connection_registry.dispose_all()
+    semantic_sql_cache.save()
+    shutdown_pools()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS middleware to allow requests from our frontend
 app.add_middleware(
@@ -57,7 +120,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Collect per-stage spans for the request and report them in the Server-Timing header."""
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"  # Templated path keeps label cardinality low
+    metrics.observe(f"request:{path}", elapsed)
+    metrics.inc("http_requests", path=path, method=request.method, status=response.status_code)
+    timings["total"] = round(elapsed * 1000, 2)
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
 def print_rich_table(df):
+    from rich.console import Console
+    from rich.table import Table
+
     console = Console()
     table = Table(show_header=True, header_style="bold magenta")
 
@@ -86,210 +167,491 @@ def print_rich_table(df):
 #             "error": str(e),
 #             "sql": sql
 #         }
-def get_cached_query(sql_query):
-    """Retrieve from in-memory cache if valid"""
-    if sql_query in query_cache:
-        data, timestamp = query_cache[sql_query]
-        if time.time() - timestamp < CACHE_TTL:
-            return data  # Return cached data if within TTL
-    return None  # Expired or not found
-
-def safe_execute_query(db: Session, sql: str):
+def safe_execute_query(db: Session, sql: str, response_format: str = None, row_limit: int = None):
     """Check cache before executing query"""
-    cached_result = get_cached_query(sql)
-    if cached_result:
+    # Row cap and timeout hint are added up front, so they are part of the cache key
+    guarded = query_guard.prepare(sql, response_format, dialect_name(db.get_bind().dialect), row_limit)
+    cache_key = make_cache_key(db.info.get("connection_id"), guarded.sql)
+    cached_result = result_cache.get(cache_key)
+    if cached_result is not None:
         return cached_result
 
     try:
-        result = db.execute(text(sql))
-        rows = [dict(row._mapping) for row in result]
-
-        query_result = {"success": True, "rows": rows, "columns": list(result.keys()), "rowcount": len(rows)}
-
-        # Cache query result with timestamp
-        query_cache[sql] = (query_result, time.time())
+        # EXPLAIN first; queries estimated to examine too many rows never run
+        with span("explain"):
+            estimate = query_guard.check(db, guarded)
+        guarded.apply_timeout(db)
+
+        start = time.perf_counter()
+        result = db.execute(text(guarded.sql))
+        description = result.cursor.description if result.cursor is not None else None
+        rows = [tuple(row) for row in result]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        truncated = guarded.limit is not None and len(rows) > guarded.limit
+        query_guard.record(guarded, estimate, len(rows), elapsed_ms, truncated)
+        if truncated:
+            rows = rows[:guarded.limit]
+
+        # Rows stay tuples; column kinds come from the cursor metadata, once per result
+        column_types = column_kinds(description, db.get_bind().dialect.name, rows)
+        query_result = {
+            "success": True, "rows": rows, "columns": list(result.keys()),
+            "column_types": column_types, "rowcount": len(rows), "truncated": truncated
+        }
+
+        # Cache query result; the cache evicts by size and TTL
+        result_cache.set(cache_key, query_result)
 
         return query_result
+    except QueryRejectedError as e:
+        return {"success": False, "error": str(e), "sql": sql, "rejected": True}
     except Exception as e:
+        db.rollback()
         return {"success": False, "error": str(e), "sql": sql}
 
 
+def guard_stream_query(db: Session, sql: str):
+    """
+    Guard a query whose result is streamed: EXPLAIN check and timeout, no row cap.
+    Raises ``QueryRejectedError``; the timeout is applied on the stream's own connection.
+    """
+    guarded = query_guard.prepare(sql, dialect=dialect_name(db.get_bind().dialect))
+    with span("explain"):
+        query_guard.check(db, guarded)
+    return guarded
+
+
+def execute_chart_query(db: Session, sql: str, chart_type: str):
+    """
+    Execute a chart query, reducing it in the database only when it has to be.
+
+    A count probe, stopped after the chart's point budget plus one row, decides
+    first: a result within budget runs as is, in the query's own order. Only a
+    larger result runs with the reduction pushed down, falling back to the
+    original query (reduced in memory by build_response) if that fails.
+    """
+    if not CHART_PUSHDOWN:
+        return safe_execute_query(db, sql, chart_type)
+
+    budget = chart_budget(chart_type)
+    probe_sql = chart_count_probe(sql, budget)
+    if probe_sql is None:
+        return safe_execute_query(db, sql, chart_type)
+    probe = safe_execute_query(db, probe_sql)
+    if probe.get("rejected"):
+        return {**probe, "sql": sql}
+    if not probe["success"]:
+        logger.info(f"Chart row probe failed, running original query: {probe['error']}")
+        return safe_execute_query(db, sql, chart_type)
+    if probe["rows"][0][0] <= budget:
+        return safe_execute_query(db, sql, chart_type)
+
+    reduced_sql = pushdown_chart_reduction(db, sql, chart_type, budget)
+    if reduced_sql != sql:
+        query_result = safe_execute_query(db, reduced_sql, chart_type)
+        if query_result["success"]:
+            logger.info(f"Chart reduction pushed down: {query_result['rowcount']} rows returned")
+            return label_other_rows(query_result)
+        if query_result.get("rejected"):
+            return query_result
+        logger.info(f"Chart pushdown failed, running original query: {query_result['error']}")
+    return safe_execute_query(db, sql, chart_type)
+
+
+def build_response(sql_query: str, query_result: dict, response_format: str, store: bool = False, connection_id=None):
+    """
+    Turn an executed query result into the response payload for the requested format.
+
+    With ``store``, the decoded result is also kept in the result store and
+    its handle returned, for paging and re-rendering without re-execution.
+    """
+    # Typed columns straight from the cursor metadata; no per-column numeric probing
+    with span("dataframe"):
+        df = decode_frame(query_result)
+    # df = pd.read_sql_query(text(query_result), db.bind)
+    logger.info(f"DataFrame created with shape: {df.shape}")
+
+    with span("render"):
+        response = render_frame(sql_query, df, response_format)
+    if store:
+        response["handle"] = result_store.put(sql_query, df, connection_id, query_result.get("truncated", False))
+    return response
+
+
+def render_frame(sql_query: str, df: pd.DataFrame, response_format: str):
+    """Render a decoded result in ``response_format``."""
+    response = {"query": sql_query, "format": response_format}
+    logger.info(f"Response created : {response}")
+
+    # ✅ Fix: Ensure Chart is Created and Returned Properly
+    if response_format in CHART_FORMATS:
+        if len(df.columns) < 2:
+            raise HTTPException(status_code=400, detail="Chart format requires at least 2 columns.")
+
+        # Never ship more points than the chart can show (LTTB for lines, top-N + "Other" otherwise)
+        df, reduction = reduce_for_chart(df, response_format)
+        if reduction:
+            response["downsampled"] = reduction
+
+        # PNG rendering (chart_mode=png) happens afterwards on the chart process pool, from this spec
+        response["chart_spec"] = build_chart_spec(df, response_format)
+        response["message"] = "Chart spec generated successfully."
+
+    elif response_format == "json":
+        # first_row = df.iloc[0].to_dict()
+        # response["message"] = f"{', '.join([f'{k}: {v}' for k, v in first_row.items()])}."
+        # Nested values were already flattened during decoding
+        response["result"] = frame_records(df)
+
+    elif response_format == "text":
+        # Column-wise formatting, capped by TEXT_MAX_ROWS / TEXT_MAX_CHARS
+        response["result"], truncated = format_text(df)
+        if truncated:
+            response["truncated"] = truncated
+
+    elif response_format == "table":
+        if tabulate_installed:
+            response["result"] = frame_records(df, missing="")  # NaN -> "", infinity -> None
+        else:
+            logger.debug("tabulate not installed, rendering the table as plain text")
+            response["result"] = df.to_string(index=False)
+    else:
+        raise HTTPException(status_code=400, detail="Invalid format specified")
+
+    return response
+
+
+def _encode_json(payload):
+    return JSONResponse(content=jsonable_encoder(payload))
+
+
+async def serialize_response(payload: dict):
+    """JSON-encode a large payload on the cpu pool, timed as the ``serialize`` span."""
+    return await timed_stage("serialize", run_blocking("cpu", _encode_json, payload))
+
+
+async def render_chart(response: dict, sql_query: str, style_overrides):
+    """
+    Replace ``response['chart_spec']`` with a server-rendered PNG (chart_mode=png).
+    If rendering fails the spec stays, so the client can still draw the chart.
+    """
+    if "chart_spec" not in response:
+        return
+    # Server-side rendering is opt-in; it costs CPU and a multi-MB payload
+    try:
+        response["chart"] = await timed_stage(
+            "chart", chart_renderer.render(sql_query, response["chart_spec"], chart_style(style_overrides))
+        )
+        del response["chart_spec"]
+        response["message"] = "Chart generated successfully."
+        logger.info("Chart successfully generated and encoded.")
+    except Exception as chart_error:
+        logger.error(f"Chart generation failed: {str(chart_error)}")
+        response["chart"] = None
+
+
+async def classify_and_generate(user_input: str, connection_id=None):
+    """
+    Return the generated SQL, or None when the message is generic.
+
+    The local classifier runs first, inline (it is keyword scoring against
+    the in-memory schema vocabulary). Only when it is unsure is the LLM
+    classifier asked, and in speculative mode SQL generation starts
+    alongside it; a generic verdict cancels (or discards) the SQL generation.
+    """
+    with span("classify"):
+        label = classify_locally(user_input, connection_id)
+    if label == "YES":
+        return None
+    if label == "NO":
+        return await timed_stage("generate_sql", run_blocking("llm", generate_sql_query, user_input, connection_id))
+
+    if not SPECULATIVE_SQL:
+        if await timed_stage("classify", run_blocking("llm", classify_with_llm, user_input)) == "YES":
+            return None
+        return await timed_stage("generate_sql", run_blocking("llm", generate_sql_query, user_input, connection_id))
+
+    start = time.perf_counter()
+    # The draft is not written to the semantic cache until the message is confirmed to be a data question
+    sql_task = asyncio.ensure_future(
+        timed_stage("generate_sql", run_blocking("llm", draft_sql_query, user_input, connection_id))
+    )
+    try:
+        is_generic = await timed_stage("classify", run_blocking("llm", classify_with_llm, user_input))
+    except BaseException:
+        sql_task.cancel()
+        raise
+    if is_generic == "YES":
+        # A call that has not started yet is dropped; one already running finishes unobserved
+        # and its SQL is never cached
+        sql_task.cancel()
+        return None
+
+    sql_query, commit = await sql_task
+    if commit is not None:
+        await run_blocking("cpu", commit)
+    elapsed = (time.perf_counter() - start) * 1000
+    timings = current_timings()
+    if timings is not None:
+        timings["speculative_saved"] = round(max(timings["classify"] + timings["generate_sql"] - elapsed, 0.0), 2)
+    return sql_query
+
+
 @app.get("/")
 def home():
     return {"message": "AI SQL Chatbot Backend is Running!"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until warm-up has finished, with per-step status"""
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Cache hit ratios, pool usage and guard counters, read on every /metrics scrape
+metrics.register_collector("result_cache", lambda: result_cache.stats())
+metrics.register_collector("semantic_cache", lambda: semantic_sql_cache.stats())
+metrics.register_collector("embedding_cache", lambda: embedding_cache.stats())
+metrics.register_collector("chart_cache", lambda: chart_renderer.cache.stats())
+metrics.register_collector("result_store", lambda: result_store.stats())
+metrics.register_collector("classifier", lambda: local_classifier.stats())
+metrics.register_collector("query_guard", lambda: query_guard.stats())
+metrics.register_collector("connections", lambda: {"pool": connection_registry.stats()})
+metrics.register_collector("singleflight", lambda: query_flights.stats())
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage latency histograms, LLM token counters and cache gauges in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Report hit/miss/eviction counters for the query result cache"""
+    return result_cache.stats()
+
+@app.get("/semantic-cache/stats")
+def semantic_cache_stats():
+    """Report hit/miss counters for the NL→SQL semantic cache"""
+    return semantic_sql_cache.stats()
+
+@app.get("/embedding-cache/stats")
+def embedding_cache_stats():
+    """Report memory/disk hit counters for the embedding cache"""
+    return embedding_cache.stats()
+
+@app.get("/connections/stats")
+def connection_stats():
+    """Report per-connection pool usage (checked out, overflow, idle time)"""
+    return connection_registry.stats()
+
+@app.get("/guard/stats")
+def guard_stats():
+    """Report cost-guard rejections and recent EXPLAIN estimates vs. actual rows"""
+    return query_guard.stats()
+
+@app.get("/singleflight/stats")
+def singleflight_stats():
+    """Report how many /query/ requests were coalesced onto an identical in-flight one"""
+    return query_flights.stats()
+
+@app.get("/classifier/stats")
+def classifier_stats():
+    """Report how often the local classifier skipped the LLM call"""
+    return local_classifier.stats()
+
+def get_db(request: Request):
+    """
+    Session for the connection named by the ``X-Connection-Id`` header or the
+    ``connection_id`` query parameter (the last connected database otherwise).
+    """
+    requested = request.headers.get("X-Connection-Id") or request.query_params.get("connection_id")
+    connection_id = connection_registry.resolve(requested)
+    try:
+        db = connection_registry.session(connection_id)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"No active database connection '{connection_id}'")
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Formats answered with a StreamingResponse; a stream can only be sent once, so these are never coalesced
+STREAMING_FORMATS = ("ndjson", "text_stream") + tuple(COLUMNAR_MEDIA_TYPES)
+
 @app.post("/query/")
 async def process_query(user_message: dict, db: Session = Depends(get_db)):
-    logger.info(f"Received request: {user_message}")
+    logger.info(f"Received request: {truncate(user_message)}")
     user_input = user_message.get("message", "").strip()
     response_format = user_message.get("format", "json")
+    chart_mode = user_message.get("chart_mode", CHART_RENDER_DEFAULT)
 
     if not user_input:
         raise HTTPException(status_code=400, detail="Empty query received")
-    
+    if chart_mode not in CHART_RENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid chart_mode, expected one of {CHART_RENDER_MODES}")
+
     try:
-        if is_generic_message(user_input) == "YES":
-            print("GENERIC MESSAGES")
-            return {
-                "message": "Hi, I am a Kissflow Data AI Agent. Only Analytics Based Questions are allowed.",
-                "format": "text"
-            }
-
-        sql_query = generate_sql_query(user_input)
-        logger.info(f"Generated SQL: {sql_query}")
-
-        query_result = safe_execute_query(db, sql_query)
-        logger.info(f"Query Result: {query_result}")
-        if not query_result["success"]:
-            raise HTTPException(status_code=400, detail=f"SQL Error: {query_result['error']}")
-
-        if not query_result["rows"]:
-            return {
-                "query": sql_query,
-                "format": response_format,
-                "message": "No Matching Results",
-                "result": []
-            }
-
-        df = pd.DataFrame(query_result["rows"])
-        # df = pd.read_sql_query(text(query_result), db.bind)
-        logger.info(f"DataFrame created with shape: {df.shape}")
-        logger.info(f"DataFrame created : {df}")
-
-        for col in df.columns:
-            try:
-                df[col] = pd.to_numeric(df[col], errors='raise')
-            except:
-                pass
-
-        response = {"query": sql_query, "format": response_format}
-        logger.info(f"Response created : {response}")
-
-        # ✅ Fix: Ensure Chart is Created and Returned Properly
-        if response_format in ["line_chart", "bar_chart", "pie_chart"]:
-            if len(df.columns) < 2:
-                raise HTTPException(status_code=400, detail="Chart format requires at least 2 columns.")
-
-            try:
-                # ✅ Create the figure and axis
-                fig, ax = plt.subplots(figsize=(10, 6))
-                x_col, y_col = df.columns[:2]
-
-                # ✅ Custom color palette for professional look
-                colors = ["#0088FE", "#00C49F", "#FFBB28", "#FF8042", "#8884D8"]
-
-                if response_format == "line_chart":
-                    df.plot(
-                        x=x_col, 
-                        y=y_col, 
-                        ax=ax, 
-                        marker='s',  # Square markers
-                        linestyle='-', 
-                        color=colors[0], 
-                        linewidth=2, 
-                        markersize=6
-                    )
-                    ax.set_title(f"{y_col} by {x_col}", fontsize=14, fontweight='bold', color="#333")
-
-                elif response_format == "bar_chart":
-                    df.plot.bar(
-                        x=x_col, 
-                        y=y_col, 
-                        ax=ax, 
-                        color=colors[1]
-                    )
-                    ax.set_title(f"{y_col} by {x_col}", fontsize=14, fontweight='bold', color="#333")
-
-                elif response_format == "pie_chart":
-                    df.plot.pie(
-                        y=y_col, 
-                        labels=df[x_col], 
-                        ax=ax, 
-                        autopct='%1.1f%%', 
-                        colors=colors, 
-                        startangle=140, 
-                        wedgeprops={'edgecolor': 'white'}
-                    )
-                    ax.set_ylabel("")
-                    ax.set_title(f"{y_col} Distribution", fontsize=14, fontweight='bold', color="#333")
-
-                # ✅ Improve readability of X and Y axis
-                ax.set_xlabel(x_col, fontsize=12, fontweight='bold', color="#555")
-                ax.set_ylabel(y_col, fontsize=12, fontweight='bold', color="#555")
-
-                # ✅ Format Y-axis numbers to avoid scientific notation
-                ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f"{int(x):,}"))
-
-                # ✅ Add grid for better readability
-                ax.grid(visible=True, linestyle="--", alpha=0.6)
-
-                # ✅ Add a professional legend
-                ax.legend([y_col], loc="best", fontsize=12, frameon=True, edgecolor="#ccc")
-
-                # ✅ Save chart as base64
-                img_buffer = io.BytesIO()
-                plt.savefig(img_buffer, format='png', bbox_inches='tight', dpi=300)  # High DPI for sharp output
-                img_buffer.seek(0)
-                response["chart"] = f"data:image/png;base64,{base64.b64encode(img_buffer.read()).decode()}"
-                response["message"] = "Chart generated successfully."
-                plt.close()
-                logger.info("Chart successfully generated and encoded.")
-                logger.info(f"Response updated : {response}")
-
-            except Exception as chart_error:
-                logger.error(f"Chart generation failed: {str(chart_error)}")
-                response["chart"] = None
-
-        elif response_format == "json":
-            # first_row = df.iloc[0].to_dict()
-            # response["message"] = f"{', '.join([f'{k}: {v}' for k, v in first_row.items()])}."
-            df = df.applymap(lambda x: str(x) if isinstance(x, (dict, list)) else x)
-            response["result"] = df.to_dict(orient="records")
-
-        elif response_format == "text":
-            # 1. If DataFrame has exactly 1 row and 1 column
-            if df.shape == (1, 1):
-                col_name = df.columns[0]
-                val = df.iloc[0, 0]
-                text_data = f'"{col_name}": {val}'
-
-            # 2. Else if DataFrame has exactly 1 row but multiple columns
-            elif df.shape[0] == 1:
-                row = df.iloc[0]
-                # e.g. "ColumnA: 123, ColumnB: ABC"
-                text_data = ', '.join(f'{col}: {row[col]}' for col in df.columns)
-
-            # 3. Otherwise, multiple rows
-            else:
-                text_lines = []
-                for idx, row in df.iterrows():
-                    line_str = ', '.join(f'{col}: {row[col]}' for col in df.columns)
-                    text_lines.append(line_str)
-                # Join each row's text on a newline
-                text_data = '\n'.join(text_lines)
-
-            response["result"] = text_data
-
-
-        elif response_format == "table":
-            if tabulate_installed:
-                print("Tabulate installed")
-                df = df.fillna("").replace([float('inf'), float('-inf')], None)  # Fix NaN and infinity values
-                response["result"] = df.to_dict(orient="records")  # Convert DataFrame safely
-            else:
-                print("Tabulate Not installed")
-                response["result"] = df.to_string(index=False)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid format specified")
+        if response_format in STREAMING_FORMATS or not SINGLE_FLIGHT:
+            return await answer_query(db, user_message, user_input, response_format, chart_mode)
+
+        # Identical questions already in flight (e.g. a dashboard opened by many users) share one answer
+        connection_id = db.info.get("connection_id")
+        key = (
+            normalize_question(user_input), connection_id, response_format, chart_mode,
+            json.dumps(user_message.get("chart_style"), sort_keys=True, default=str), bool(user_message.get("handle"))
+        )
+        start = time.perf_counter()
+        result, shared = await query_flights.do(
+            key, lambda: answer_query(db, user_message, user_input, response_format, chart_mode)
+        )
+        if not shared:
+            return result
+        record_stage("coalesced", time.perf_counter() - start)
+        metrics.inc("queries", format=response_format, outcome="coalesced")
+        return coalesced_response(result)
 
-        return response
+    except HTTPException:
+        raise
 
     except Exception as e:
         logger.error(f"Processing failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
-# Store active database connections
-active_connections = {}
+
+def coalesced_response(result):
+    """Copy of a shared answer; each request needs its own Response object (the middleware sets its headers)."""
+    if isinstance(result, Response):
+        return Response(
+            content=result.body, status_code=result.status_code, media_type=result.media_type,
+            headers={"X-Coalesced": "true"}
+        )
+    return result
+
+
+async def answer_query(db: Session, user_message: dict, user_input: str, response_format: str, chart_mode: str):
+    """Classify, generate SQL, execute and render one /query/ request."""
+    # Filled by the spans below; also sent as the Server-Timing header
+    timings = current_timings()
+    # Blocking LLM and database calls run on bounded worker pools, off the event loop
+    sql_query = await classify_and_generate(user_input, db.info.get("connection_id"))
+    if sql_query is None:
+        logger.info("Question classified as generic, no SQL generated")
+        metrics.inc("queries", format=response_format, outcome="generic")
+        return {
+            "message": "Hi, I am a Kissflow Data AI Agent. Only Analytics Based Questions are allowed.",
+            "format": "text",
+            "timings": timings
+        }
+
+    logger.info(f"Generated SQL: {sql_query}")
+
+    if response_format in STREAMING_FORMATS:
+        if response_format in COLUMNAR_MEDIA_TYPES and not pyarrow_installed:
+            raise HTTPException(status_code=400, detail=f"Format '{response_format}' requires pyarrow to be installed")
+        try:
+            guarded = await run_blocking("db", guard_stream_query, db, sql_query)
+        except QueryRejectedError as e:
+            metrics.inc("queries", format=response_format, outcome="rejected")
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if response_format == "ndjson":
+        # Stream rows from a server-side cursor instead of materializing the result
+        return StreamingResponse(
+            stream_ndjson(db.get_bind(), guarded.sql, on_connect=guarded.apply_timeout), media_type="application/x-ndjson"
+        )
+
+    if response_format == "text_stream":
+        return StreamingResponse(
+            stream_text(db.get_bind(), guarded.sql, on_connect=guarded.apply_timeout),
+            media_type="text/plain; charset=utf-8"
+        )
+
+    if response_format in COLUMNAR_MEDIA_TYPES:
+        return StreamingResponse(
+            stream_columnar(db.get_bind(), guarded.sql, response_format, on_connect=guarded.apply_timeout),
+            media_type=COLUMNAR_MEDIA_TYPES[response_format],
+            headers={"Content-Disposition": f'attachment; filename="result.{response_format}"'}
+        )
+
+    if response_format in CHART_FORMATS:
+        query_result = await timed_stage("execute", run_blocking("db", execute_chart_query, db, sql_query, response_format))
+    else:
+        query_result = await timed_stage("execute", run_blocking("db", safe_execute_query, db, sql_query, response_format))
+    logger.info(f"Query Result: {summarize_result(query_result)}")
+    if not query_result["success"]:
+        metrics.inc("queries", format=response_format, outcome="rejected" if query_result.get("rejected") else "sql_error")
+        detail = query_result["error"] if query_result.get("rejected") else f"SQL Error: {query_result['error']}"
+        raise HTTPException(status_code=400, detail=detail)
+
+    if not query_result["rows"]:
+        metrics.inc("queries", format=response_format, outcome="empty")
+        return {
+            "query": sql_query,
+            "format": response_format,
+            "message": "No Matching Results",
+            "result": [],
+            "timings": timings
+        }
+
+    # "handle": true keeps the result server-side for /results/{handle} paging and re-rendering
+    response = await run_blocking(
+        "cpu", build_response, sql_query, query_result, response_format,
+        bool(user_message.get("handle")), db.info.get("connection_id")
+    )
+    if query_result.get("truncated"):
+        # The guard's automatic LIMIT cut the result
+        response["row_limit"] = query_guard.auto_limit
+
+    if chart_mode == "png":
+        await render_chart(response, sql_query, user_message.get("chart_style"))
+    metrics.inc("queries", format=response_format, outcome="ok")
+    response["timings"] = dict(timings)
+    return await serialize_response(response)
+
+PAGED_FORMATS = ("json", "table", "text")
+
+@app.get("/results/stats")
+def result_store_stats():
+    """Report usage of the stored result handles"""
+    return result_store.stats()
+
+@app.get("/results/{handle}")
+async def get_result_page(handle: str, cursor: str = None, limit: int = RESULT_PAGE_SIZE, format: str = "json"):
+    """Page through a stored result; ``next_cursor`` is null on the last page"""
+    if format not in PAGED_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of {PAGED_FORMATS}")
+    try:
+        stored, page, next_cursor = result_store.page(handle, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Result handle is unknown or has expired")
+
+    response = await timed_stage("render", run_blocking("cpu", render_frame, stored.sql, page, format))
+    response.update({"handle": handle, "next_cursor": next_cursor, "total_rows": stored.rowcount})
+    if stored.truncated:
+        response["row_limit"] = query_guard.auto_limit
+    return await serialize_response(response)
+
+@app.post("/results/{handle}/render")
+async def render_result(handle: str, options: dict):
+    """Re-render a stored result in another format, without the LLM or the database"""
+    response_format = options.get("format", "json")
+    chart_mode = options.get("chart_mode", CHART_RENDER_DEFAULT)
+    if chart_mode not in CHART_RENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid chart_mode, expected one of {CHART_RENDER_MODES}")
+    stored = result_store.get(handle)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Result handle is unknown or has expired")
+
+    response = await timed_stage("render", run_blocking("cpu", render_frame, stored.sql, stored.frame, response_format))
+    if chart_mode == "png":
+        await render_chart(response, stored.sql, options.get("chart_style"))
+    response["handle"] = handle
+    if stored.truncated:
+        response["row_limit"] = query_guard.auto_limit
+    response["timings"] = dict(current_timings())
+    return await serialize_response(response)
 
 @app.post("/connect/")
 async def connect_database(connection: DatabaseConnection):
@@ -306,15 +668,10 @@ async def connect_database(connection: DatabaseConnection):
         )
         logger.info("Constructed connection string (password hidden)")
         
-        # Create engine with connection pooling
-        engine = create_engine(
-            connection_string,
-            pool_size=20,
-            max_overflow=40,
-            pool_recycle=180,
-            pool_pre_ping=True
-        )
-        logger.info("Created SQLAlchemy engine")
+        # Reuse the pooled engine when this connection is already known with the same URL
+        connection_id = f"{connection.db_host}_{connection.db_name}"
+        engine, created = connection_registry.connect(connection_id, connection_string)
+        logger.info(f"{'Created' if created else 'Reusing'} SQLAlchemy engine for {connection_id}")
         
         # Test connection with detailed error handling
         try:
@@ -330,19 +687,21 @@ async def connect_database(connection: DatabaseConnection):
                 table_list = [table[0] for table in tables]
                 logger.info(f"Successfully fetched {len(table_list)} tables")
                 
-                # Store the engine in active connections
-                connection_id = f"{connection.db_host}_{connection.db_name}"
-                active_connections[connection_id] = engine
+                # Bulk-load the schema in the background and keep it fresh
+                schema_registry.register(connection_id, engine)
                 logger.info(f"Stored connection with ID: {connection_id}")
                 
                 return {
                     "status": "success",
                     "message": "Database connected successfully",
+                    "connection_id": connection_id,
                     "tables_found": len(table_list),
                     "tables": table_list[:10]  # Return first 10 tables for preview
                 }
         except Exception as conn_error:
             logger.error(f"Database connection error: {str(conn_error)}")
+            if created:
+                connection_registry.remove(connection_id)
             raise HTTPException(
                 status_code=400,
                 detail=f"Failed to connect to database: {str(conn_error)}"
@@ -354,18 +713,11 @@ async def connect_database(connection: DatabaseConnection):
             detail=f"Connection error: {str(e)}"
         )
 
-# Modify get_db to use the active connection
-def get_db():
-    """Get database session from active connection"""
-    # For now, we'll use the first active connection
-    # In a real app, you'd want to handle multiple connections
-    if not active_connections:
-        raise HTTPException(status_code=400, detail="No active database connection")
-    
-    engine = list(active_connections.values())[0]
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+@app.delete("/connections/{connection_id}")
+def disconnect_database(connection_id: str):
+    """Dispose a connection's pool and forget its schema"""
+    if not connection_registry.remove(connection_id):
+        raise HTTPException(status_code=404, detail=f"Unknown connection '{connection_id}'")
+    schema_registry.unregister(connection_id)
+    return {"status": "success", "message": f"Disconnected {connection_id}"}
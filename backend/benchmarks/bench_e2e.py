@@ -0,0 +1,251 @@
+"""
+Offline end-to-end benchmark of the /query/ endpoint.
+
+Drives the FastAPI app in-process (httpx ASGI transport) with a deterministic
+fake OpenAI client and a local SQLite database of synthetic tables, then
+reports p50/p95/p99 latency, throughput and peak RSS per format.
+
+    python benchmarks/bench_e2e.py --sizes 1000,100000 --concurrency 8 --requests 50
+    python benchmarks/bench_e2e.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_e2e.py --baseline benchmarks/baseline.json --tolerance 0.2
+
+Run from the backend directory. Exits with status 1 when a regression is flagged.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FORMATS = ("json", "table", "text", "bar_chart", "pie_chart", "line_chart")
+
+# SQL the fake model "generates" for each format; {table} is the synthetic table
+SQL_TEMPLATES = {
+    "json": "SELECT `id`, `region`, `product`, `amount`, `created_on` FROM `{table}`",
+    "table": "SELECT `id`, `region`, `product`, `amount`, `quantity` FROM `{table}`",
+    "text": "SELECT `region`, `product`, `amount` FROM `{table}`",
+    "bar_chart": "SELECT `product`, SUM(`amount`) AS `total` FROM `{table}` GROUP BY `product`",
+    "pie_chart": "SELECT `region`, SUM(`amount`) AS `total` FROM `{table}` GROUP BY `region`",
+    "line_chart": "SELECT `created_on`, SUM(`amount`) AS `total` FROM `{table}` GROUP BY `created_on` ORDER BY `created_on`",
+}
+
+_TAG_RE = re.compile(r"\[(\w+):(\w+)\]")
+
+
+class FakeOpenAI:
+    """
+    Stands in for ``openai.OpenAI``: chat completions answer from
+    ``SQL_TEMPLATES`` by the ``[format:table]`` tag in the question, and
+    embeddings come from the local hashing embedder. Each call sleeps for its
+    configured latency first, like a network round trip would.
+    """
+
+    def __init__(self, classify_latency, generate_latency, embed_latency):
+        from embedders import HashingEmbedder
+
+        self.latency = {"classify": classify_latency, "generate": generate_latency, "embed": embed_latency}
+        self._hashing = HashingEmbedder(dim=1536)
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._chat))
+        self.embeddings = types.SimpleNamespace(create=self._embed)
+
+    @staticmethod
+    def _usage(prompt, completion=0):
+        return types.SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, prompt_tokens_details=None)
+
+    def _chat(self, model, messages, **kwargs):
+        question = messages[-1]["content"]
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        if not any("Database schema:" in m["content"] for m in messages):
+            time.sleep(self.latency["classify"])
+            content = "NO"
+        else:
+            time.sleep(self.latency["generate"])
+            match = _TAG_RE.search(question)
+            fmt, table = match.groups() if match else ("json", "sales_1000")
+            content = SQL_TEMPLATES[fmt].format(table=table)
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=message)],
+            usage=self._usage(prompt_tokens, len(content) // 4),
+        )
+
+    def _embed(self, input, model, **kwargs):
+        time.sleep(self.latency["embed"])
+        texts = [input] if isinstance(input, str) else list(input)
+        matrix = self._hashing.embed(texts)
+        data = [types.SimpleNamespace(index=i, embedding=row.tolist()) for i, row in enumerate(matrix)]
+        return types.SimpleNamespace(data=data, usage=self._usage(sum(len(t) for t in texts) // 4))
+
+
+def create_tables(engine, sizes, seed=0):
+    """Create ``sales_<rows>`` tables of synthetic orders; existing tables are reused."""
+    from sqlalchemy import inspect, text
+
+    existing = set(inspect(engine).get_table_names())
+    rng = np.random.default_rng(seed)
+    regions = np.array(["North", "South", "East", "West", "Central"], dtype=object)
+    products = np.array([f"Product {i:03d}" for i in range(200)], dtype=object)
+    days = np.array([str(d) for d in np.arange("2023-01-01", "2025-01-01", dtype="datetime64[D]")], dtype=object)
+    chunk = 200_000
+
+    for rows in sizes:
+        table = f"sales_{rows}"
+        if table in existing:
+            continue
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE `{table}` (`id` INTEGER PRIMARY KEY, `region` TEXT, `product` TEXT, "
+                f"`amount` REAL, `quantity` INTEGER, `created_on` TEXT)"
+            ))
+            for offset in range(0, rows, chunk):
+                n = min(chunk, rows - offset)
+                batch = zip(
+                    range(offset, offset + n),
+                    regions[rng.integers(0, len(regions), n)].tolist(),
+                    products[rng.integers(0, len(products), n)].tolist(),
+                    np.round(rng.gamma(2.0, 150.0, n), 2).tolist(),
+                    rng.integers(1, 20, n).tolist(),
+                    days[rng.integers(0, len(days), n)].tolist(),
+                )
+                conn.exec_driver_sql(f"INSERT INTO `{table}` VALUES (?, ?, ?, ?, ?, ?)", list(batch))
+        print(f"Created {table} in {time.perf_counter() - start:.1f}s")
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else None
+
+
+async def run_format(client, fmt, table, concurrency, requests_per_client, connection_id):
+    latencies, errors = [], 0
+    counter = iter(range(concurrency * requests_per_client))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            # A unique suffix defeats the NL->SQL caches, so every request takes the full path
+            payload = {"message": f"[{fmt}:{table}] total amount by product #{i}", "format": fmt}
+            start = time.perf_counter()
+            response = await client.post("/query/", json=payload, headers={"X-Connection-Id": connection_id})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+                if errors == 1:
+                    print(f"  {fmt}: HTTP {response.status_code} {response.text[:200]}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": len(latencies) / elapsed if elapsed else None,
+        # ru_maxrss is the process peak so far (KiB on Linux)
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions: p95 latency up, or throughput down, by more than ``tolerance``."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {previous['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s"
+            )
+    return regressions
+
+
+async def main(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-e2e-")
+    os.makedirs(workdir, exist_ok=True)
+    # Configure the app before it is imported: no result cache, scratch cache files, fake credentials
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ["RESULT_CACHE_MAX_BYTES"] = "0"
+    os.environ["SEMANTIC_CACHE_PATH"] = os.path.join(workdir, "semantic_sql_cache.npz")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite3")
+    os.environ["EMBEDDING_INDEX_DIR"] = os.path.join(workdir, "embedding_index")
+
+    import httpx
+    from sqlalchemy import create_engine
+
+    import llama_sql_agent
+    from app import app
+    from connection_registry import connection_registry
+    from schema_service import schema_registry
+
+    fake = FakeOpenAI(args.classify_latency, args.generate_latency, args.embed_latency)
+    llama_sql_agent.set_client(fake)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+                           connect_args={"check_same_thread": False})
+    create_tables(engine, sizes)
+    connection_id = "bench"
+    connection_registry.add(connection_id, engine)
+    schema_registry.register(connection_id, engine, start=False)
+
+    formats = args.formats.split(",") if args.formats else FORMATS
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'format':<12} {'rows':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'rss MB':>8} {'errors':>6}")
+        for rows in sizes:
+            for fmt in formats:
+                stats = await run_format(client, fmt, f"sales_{rows}", args.concurrency, args.requests, connection_id)
+                results[f"{fmt}@{rows}"] = stats
+                print(f"{fmt:<12} {rows:>9} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} "
+                      f"{stats['throughput_rps']:>8.1f} {stats['peak_rss_mb']:>8.0f} {stats['errors']:>6}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000", help="Comma-separated table sizes (rows), up to 10000000")
+    parser.add_argument("--formats", default=None, help=f"Comma-separated subset of {','.join(FORMATS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=25, help="Requests per client, per format and size")
+    parser.add_argument("--classify-latency", type=float, default=0.3, help="Fake is_generic_message latency (s)")
+    parser.add_argument("--generate-latency", type=float, default=1.5, help="Fake generate_sql_query latency (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.1, help="Fake embeddings latency (s)")
+    parser.add_argument("--workdir", default=None, help="Directory for the SQLite file and caches (reused if present)")
+    parser.add_argument("--baseline", default=None, help="Compare against this baseline JSON")
+    parser.add_argument("--save-baseline", default=None, help="Write results to this baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p95/throughput change")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
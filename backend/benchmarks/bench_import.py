@@ -0,0 +1,75 @@
+"""
+Import-time check for the app module.
+
+Imports ``app`` in a fresh interpreter with ``-X importtime`` and reports the
+wall time plus the slowest modules by cumulative import time. Importing must
+not touch the network or the database, so this runs without credentials.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --target 1.5 --top 25
+
+Run from the backend directory. Exits with status 1 when the import takes
+longer than the target (IMPORT_TIME_TARGET seconds).
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time:       self [us] |  cumulative | imported package"
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+_SCRIPT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def measure(module="app"):
+    """Return ``(wall_seconds, [(cumulative_us, self_us, depth, name), ...])`` for one cold import."""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "import-check")
+    env.setdefault("WARMUP_MODE", "off")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SCRIPT.format(module=module)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((int(cumulative_us), int(self_us), len(indent) // 2, name))
+    return float(proc.stdout.strip().splitlines()[-1]), modules
+
+
+def main(args):
+    wall, modules = measure(args.module)
+    # The module and its direct imports; deeper entries are already counted in their parent's cumulative time
+    top_level = sorted((m for m in modules if m[2] <= 1), reverse=True)[:args.top]
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, _, name in top_level:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    print(f"\nimport {args.module}: {wall:.3f}s wall, {len(modules)} modules (target {args.target:.2f}s)")
+
+    if wall > args.target:
+        print(f"FAIL import time {wall:.3f}s exceeds the {args.target:.2f}s target")
+        return 1
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="Module to import")
+    parser.add_argument("--target", type=float, default=float(os.getenv("IMPORT_TIME_TARGET", "2.0")),
+                        help="Maximum wall time in seconds")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to list")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,67 @@
+"""
+Compare the column-wise ``text`` formatter against the old ``iterrows`` loop.
+
+    python benchmarks/bench_text_format.py --rows 10000,100000,1000000
+
+Run from the backend directory. Caps are disabled so both paths format every row.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_format import format_text  # noqa: E402
+
+
+def iterrows_text(df):
+    """The previous implementation, kept here as the baseline."""
+    text_lines = []
+    for idx, row in df.iterrows():
+        line_str = ', '.join(f'{col}: {row[col]}' for col in df.columns)
+        text_lines.append(line_str)
+    return '\n'.join(text_lines)
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "AccountID": np.arange(rows),
+        "Region": rng.choice(["North", "South", "East", "West"], rows).astype(object),
+        "Revenue": rng.random(rows) * 10000,
+        "Orders": rng.integers(0, 500, rows),
+        "Status": rng.choice(["Active", "Cancelled", "On Track", None], rows),
+        "CreatedOn": pd.date_range("2020-01-01", periods=rows, freq="min"),
+    })
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000,1000000", help="Comma-separated row counts")
+    parser.add_argument("--iterrows-max", type=int, default=1000000,
+                        help="Skip the iterrows baseline above this many rows")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'iterrows (s)':>14} {'vectorized (s)':>16} {'speedup':>9}")
+    for rows in (int(r) for r in args.rows.split(",")):
+        df = make_frame(rows)
+        vectorized = timed(lambda d: format_text(d, max_rows=None, max_chars=None), df)
+        if rows <= args.iterrows_max:
+            baseline = timed(iterrows_text, df)
+            print(f"{rows:>10} {baseline:>14.3f} {vectorized:>16.3f} {baseline / vectorized:>8.1f}x")
+        else:
+            print(f"{rows:>10} {'skipped':>14} {vectorized:>16.3f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Build the table and column embedding indexes from the live schema.
+
+    python build_embeddings.py                     # incremental, OpenAI embeddings
+    python build_embeddings.py --provider hashing  # offline, deterministic stub
+    python build_embeddings.py --force             # re-embed every table
+
+Only tables whose column list changed since the last build (or that were
+embedded with a different model) are re-embedded; the index is saved after
+every chunk of tables so an interrupted build keeps its progress.
+"""
+import argparse
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from embedders import get_embedder
+from embedding_index import EmbeddingIndex, EMBEDDING_INDEX_DIR, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+
+def table_signature(table, columns):
+    return hashlib.sha256("\x1f".join([table, *map(str, columns)]).encode("utf-8")).hexdigest()[:16]
+
+
+def table_text(table, columns):
+    return f"Table {table} with columns: {', '.join(map(str, columns))}"
+
+
+def column_text(table, column):
+    return f"Column {column} in table {table}"
+
+
+def _previous_signatures(index, model):
+    """Table signatures recorded by a previous build with the same model."""
+    if index is None or index.meta.get("model") != model:
+        return {}
+    return index.meta.get("signatures", {})
+
+
+def _save(directory, model, signatures, table_vectors, column_vectors):
+    meta = {"model": model, "signatures": signatures}
+    EmbeddingIndex.from_mapping(table_vectors, meta=meta).save(directory, "tables")
+    EmbeddingIndex.from_mapping(column_vectors, meta=meta).save(directory, "columns")
+
+
+def build_index(tables_metadata, embedder, directory=EMBEDDING_INDEX_DIR, force=False, chunk_tables=50):
+    """
+    Embed ``tables_metadata`` (``{table: [column, ...]}``) into the index in ``directory``.
+
+    Returns the list of tables that were (re-)embedded.
+    """
+    model = embedder.model
+    old_tables = EmbeddingIndex.load(directory, "tables", mmap=False)
+    old_columns = EmbeddingIndex.load(directory, "columns", mmap=False)
+    old_signatures = {} if force else _previous_signatures(old_tables, model)
+    old_rows = {name: i for i, name in enumerate(old_tables.names)} if old_tables is not None else {}
+
+    signatures = {t: table_signature(t, cols) for t, cols in tables_metadata.items()}
+    table_vectors, column_vectors = {}, {}
+
+    # Carry over vectors for tables whose columns did not change
+    for table, signature in signatures.items():
+        if old_signatures.get(table) != signature or old_columns is None or table not in old_columns:
+            continue
+        table_vectors[table] = np.asarray(old_tables.matrix[old_rows[table]])
+        column_vectors[table] = dict(zip(old_columns.group_names(table), np.asarray(old_columns.group_matrix(table))))
+
+    changed = [t for t in tables_metadata if t not in table_vectors]
+    logger.info(f"{len(changed)} of {len(tables_metadata)} tables need embedding ({model})")
+
+    done_signatures = {t: signatures[t] for t in table_vectors}
+    for start in range(0, len(changed), chunk_tables):
+        chunk = changed[start:start + chunk_tables]
+        texts = [table_text(t, tables_metadata[t]) for t in chunk]
+        owners = []
+        for table in chunk:
+            for column in tables_metadata[table]:
+                texts.append(column_text(table, column))
+                owners.append((table, column))
+
+        # One batched embedding pass for every table and column description in the chunk
+        vectors = normalize_rows(embedder.embed(texts))
+        for i, table in enumerate(chunk):
+            table_vectors[table] = vectors[i]
+            column_vectors[table] = {}
+            done_signatures[table] = signatures[table]
+        for (table, column), vector in zip(owners, vectors[len(chunk):]):
+            column_vectors[table][column] = vector
+
+        _save(directory, model, done_signatures, table_vectors, column_vectors)
+        logger.info(f"Saved index after {min(start + chunk_tables, len(changed))}/{len(changed)} changed tables")
+
+    if not changed:
+        # Still drop tables that no longer exist in the schema
+        _save(directory, model, done_signatures, table_vectors, column_vectors)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", default=os.getenv("EMBEDDING_PROVIDER", "openai"), choices=["openai", "hashing"])
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002"))
+    parser.add_argument("--batch-size", type=int, default=512, help="Texts per embeddings request")
+    parser.add_argument("--chunk-tables", type=int, default=50, help="Tables embedded between index saves")
+    parser.add_argument("--out", default=EMBEDDING_INDEX_DIR, help="Index directory")
+    parser.add_argument("--force", action="store_true", help="Re-embed every table")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from database import get_table_metadata
+
+    if args.provider == "openai":
+        embedder = get_embedder("openai", model=args.model, batch_size=args.batch_size)
+    else:
+        embedder = get_embedder(args.provider)
+    changed = build_index(get_table_metadata(), embedder, args.out, args.force, args.chunk_tables)
+    print(f"Embedded {len(changed)} tables into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
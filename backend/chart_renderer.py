@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_DPI = int(os.getenv("CHART_DPI", "150"))
+CHART_WIDTH = float(os.getenv("CHART_WIDTH", "10"))  # inches
+CHART_HEIGHT = float(os.getenv("CHART_HEIGHT", "6"))  # inches
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CHART_CACHE_TTL = float(os.getenv("CHART_CACHE_TTL", "3600"))
+
+# Bounds for per-request overrides of the style
+STYLE_LIMITS = {"dpi": (50, 300), "width": (2.0, 20.0), "height": (2.0, 20.0)}
+
+
+def chart_style(overrides=None) -> dict:
+    """Default figure style, with any per-request ``dpi``/``width``/``height`` clamped to sane bounds."""
+    style = {"dpi": CHART_DPI, "width": CHART_WIDTH, "height": CHART_HEIGHT}
+    for key, value in (overrides or {}).items():
+        if key in STYLE_LIMITS and isinstance(value, (int, float)):
+            low, high = STYLE_LIMITS[key]
+            style[key] = type(style[key])(min(max(value, low), high))
+    return style
+
+
+def render_spec_png(spec: dict, style: dict) -> bytes:
+    """
+    Draw a chart spec to PNG bytes.
+
+    Runs inside the chart worker processes. It uses the object-oriented
+    ``Figure`` API with an Agg canvas, so there is no pyplot global state.
+    """
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import matplotlib.ticker as mticker
+
+    fig = Figure(figsize=(style["width"], style["height"]))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    chart_type = spec["type"]
+    x_field, y_field = spec["x"]["field"], spec["y"]["field"]
+    x_values, y_values = spec["data"]["x"], spec["data"]["y"]
+    y = np.array([np.nan if v is None else v for v in y_values], dtype=float)
+    colors = spec["palette"]
+
+    if chart_type == "line_chart":
+        if spec["x"]["type"] == "datetime":
+            x = np.array(x_values, dtype="datetime64[ns]")
+        elif spec["x"]["type"] == "number":
+            x = np.array([np.nan if v is None else v for v in x_values], dtype=float)
+        else:
+            x = np.arange(len(x_values))
+            ax.set_xticks(x, [str(v) for v in x_values], rotation=45, ha="right")
+        ax.plot(x, y, marker='s', linestyle='-', color=colors[0], linewidth=2, markersize=6)
+        ax.set_title(f"{y_field} by {x_field}", fontsize=14, fontweight='bold', color="#333")
+
+    elif chart_type == "bar_chart":
+        positions = np.arange(len(x_values))
+        ax.bar(positions, y, color=colors[1])
+        ax.set_xticks(positions, [str(v) for v in x_values], rotation=90)
+        ax.set_title(f"{y_field} by {x_field}", fontsize=14, fontweight='bold', color="#333")
+
+    elif chart_type == "pie_chart":
+        ax.pie(
+            np.nan_to_num(y),
+            labels=[str(v) for v in x_values],
+            autopct='%1.1f%%',
+            colors=colors,
+            startangle=140,
+            wedgeprops={'edgecolor': 'white'}
+        )
+        ax.set_title(f"{y_field} Distribution", fontsize=14, fontweight='bold', color="#333")
+
+    # ✅ Improve readability of X and Y axis
+    ax.set_xlabel(x_field, fontsize=12, fontweight='bold', color="#555")
+    ax.set_ylabel("" if chart_type == "pie_chart" else y_field, fontsize=12, fontweight='bold', color="#555")
+
+    # ✅ Format Y-axis numbers to avoid scientific notation
+    if chart_type != "pie_chart":
+        ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda v, _: f"{int(v):,}"))
+        ax.grid(visible=True, linestyle="--", alpha=0.6)
+
+    ax.legend([y_field], loc="best", fontsize=12, frameon=True, edgecolor="#ccc")
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=style["dpi"])
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    """
+    Renders chart specs to PNG on a dedicated process pool and caches the
+    encoded images by (SQL, result hash, chart type, style).
+    """
+
+    def __init__(self, workers=CHART_WORKERS, cache=None):
+        self.workers = workers
+        self.cache = cache or ResultCache(max_bytes=CHART_CACHE_MAX_BYTES, ttl=CHART_CACHE_TTL, sizeof=len)
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn: never fork a process that already runs event-loop and worker threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    @staticmethod
+    def cache_key(sql, spec, style):
+        result_hash = hashlib.sha256(
+            json.dumps(spec["data"], default=str, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+        style_key = json.dumps(style, sort_keys=True)
+        return hashlib.sha256(f"{sql}\0{result_hash}\0{spec['type']}\0{style_key}".encode("utf-8")).hexdigest()
+
+    async def render(self, sql, spec, style=None):
+        """Return the chart as a base64 PNG data URI, from the cache when possible."""
+        style = style or chart_style()
+        key = self.cache_key(sql, spec, style)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self.pool, render_spec_png, spec, style)
+        data_uri = f"data:image/png;base64,{base64.b64encode(png).decode()}"
+        self.cache.set(key, data_uri)
+        return data_uri
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+chart_renderer = ChartRenderer()
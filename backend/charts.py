@@ -0,0 +1,58 @@
+import logging
+import math
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CHART_FORMATS = ("line_chart", "bar_chart", "pie_chart")
+
+# ✅ Custom color palette for professional look (shared by PNG rendering and chart specs)
+CHART_PALETTE = ["#0088FE", "#00C49F", "#FFBB28", "#FF8042", "#8884D8"]
+
+# "spec" returns a JSON chart description for the frontend to draw; "png" renders on the server
+CHART_RENDER_DEFAULT = os.getenv("CHART_RENDER_DEFAULT", "spec")
+CHART_RENDER_MODES = ("spec", "png")
+
+
+def _dtype_name(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "boolean"
+    if pd.api.types.is_numeric_dtype(series):
+        return "number"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    return "string"
+
+
+def _column_values(series: pd.Series, dtype: str) -> list:
+    if dtype == "datetime":
+        return [None if pd.isna(v) else v.isoformat() for v in series]
+    if dtype == "number":
+        return [None if v is None or (isinstance(v, float) and not math.isfinite(v)) else v for v in series.tolist()]
+    if dtype == "boolean":
+        return series.tolist()
+    return [None if v is None else str(v) for v in series.tolist()]
+
+
+def build_chart_spec(df: pd.DataFrame, chart_type: str) -> dict:
+    """
+    Describe a chart as JSON: type, axis columns with their types, the data as
+    one typed array per axis, and the palette. The frontend draws it.
+    """
+    x_col, y_col = df.columns[:2]
+    x_type, y_type = _dtype_name(df[x_col]), _dtype_name(df[y_col])
+    title = f"{y_col} Distribution" if chart_type == "pie_chart" else f"{y_col} by {x_col}"
+    return {
+        "type": chart_type,
+        "title": title,
+        "x": {"field": str(x_col), "type": x_type},
+        "y": {"field": str(y_col), "type": y_type},
+        "data": {
+            "x": _column_values(df[x_col], x_type),
+            "y": _column_values(df[y_col], y_type),
+        },
+        "palette": CHART_PALETTE,
+        "points": len(df),
+    }
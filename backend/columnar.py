@@ -0,0 +1,152 @@
+import importlib.util
+import io
+import json
+import logging
+
+from decoding import (
+    BOOL, BYTES, DATE, DATETIME, DECIMAL, FLOAT, INT, OBJECT, DIALECT_TYPE_KINDS, column_kinds
+)
+from streaming import iter_result_batches, STREAM_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# pyarrow is optional; the arrow / parquet formats are unavailable without it.
+# It is imported on the first columnar request, not at startup.
+pyarrow_installed = importlib.util.find_spec("pyarrow") is not None
+pa = pq = None
+
+
+def load_pyarrow():
+    global pa, pq
+    if pa is None:
+        import pyarrow
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+# Type codes of timestamp columns that carry a time zone (PostgreSQL timestamptz)
+TZ_AWARE_TYPE_CODES = {1184}
+
+COLUMNAR_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _arrow_type(kind, column, described, first):
+    """
+    Arrow type for a result column, fixed for the whole stream. ``described``
+    is False when the kind was guessed from the first value (no type code),
+    so numbers are widened to float64 in case later batches hold fractions.
+    """
+    if kind == INT:
+        return pa.int64() if described else pa.float64()
+    if kind == FLOAT:
+        return pa.float64()
+    if kind == DECIMAL:
+        precision, scale = (column[4], column[5]) if described and len(column) > 5 else (None, None)
+        if isinstance(precision, int) and isinstance(scale, int) and 0 < precision <= 76 and 0 <= scale <= precision:
+            return pa.decimal128(precision, scale) if precision <= 38 else pa.decimal256(precision, scale)
+        # Unconstrained NUMERIC: exact text rather than a precision guessed from the first batch
+        return pa.string()
+    if kind == BOOL:
+        return pa.bool_()
+    if kind == DATETIME:
+        tz_aware = column[1] in TZ_AWARE_TYPE_CODES if described else getattr(first, "tzinfo", None) is not None
+        return pa.timestamp("us", tz="UTC") if tz_aware else pa.timestamp("us")
+    if kind == DATE:
+        return pa.date32()
+    if kind == BYTES:
+        return pa.binary()
+    # STRING, JSON, OBJECT and columns that were all NULL in the first batch
+    return pa.string()
+
+
+def arrow_schema(columns, description, dialect_name, rows):
+    """
+    Build the stream's schema from ``cursor.description`` type codes (see
+    decoding.py), falling back to the first non-null value for drivers that
+    report none.
+    """
+    type_kinds = DIALECT_TYPE_KINDS.get(dialect_name, {})
+    kinds = column_kinds(description, dialect_name, rows) if description else [OBJECT] * len(columns)
+    fields = []
+    for position, (name, kind) in enumerate(zip(columns, kinds)):
+        column = description[position] if description else (name, None)
+        first = next((row[position] for row in rows if row[position] is not None), None)
+        fields.append(pa.field(name, _arrow_type(kind, column, column[1] in type_kinds, first)))
+    return pa.schema(fields)
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _column_array(values, field):
+    """
+    One Arrow array of ``field``'s type. Conversions pyarrow cannot do
+    losslessly raise (ending the stream) rather than truncating values.
+    """
+    if pa.types.is_string(field.type):
+        values = [_as_text(v) for v in values]
+    elif pa.types.is_integer(field.type):
+        # pa.array(type=int64) truncates floats; a safe cast from the inferred type raises instead
+        return pa.array(values).cast(field.type)
+    return pa.array(values, type=field.type)
+
+
+def _record_batch(columns, rows, schema):
+    column_values = list(zip(*rows)) if rows else [[] for _ in columns]
+    arrays = [_column_array(list(values), schema.field(i)) for i, values in enumerate(column_values)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def stream_columnar(engine, sql: str, fmt: str, batch_size: int = STREAM_BATCH_SIZE, on_connect=None):
+    """
+    Yield the result of ``sql`` as an Arrow IPC stream or a Parquet file.
+
+    Columns are built straight from cursor batches (no per-row dicts, no
+    DataFrame), and each batch is written out as soon as it is encoded. The
+    schema comes from the cursor's type codes, so it holds for every batch.
+    """
+    load_pyarrow()
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+    total = 0
+    try:
+        for columns, rows, description in iter_result_batches(
+            engine, sql, batch_size, with_description=True, on_connect=on_connect
+        ):
+            if schema is None:
+                schema = arrow_schema(columns, description, engine.dialect.name, rows)
+            batch = _record_batch(columns, rows, schema)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, schema) if fmt == "arrow" else pq.ParquetWriter(sink, schema)
+            if fmt == "arrow":
+                writer.write_batch(batch)
+            else:
+                writer.write_table(pa.Table.from_batches([batch]))
+            total += batch.num_rows
+            yield _drain(sink)
+
+        writer.close()
+        yield _drain(sink)
+        logger.info(f"Streamed {total} rows as {fmt}")
+    except Exception as e:
+        # Binary formats cannot carry an in-band error; truncating the body signals failure
+        logger.error(f"Columnar export failed after {total} rows: {str(e)}")
+        raise
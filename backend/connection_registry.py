@@ -0,0 +1,228 @@
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from schema_service import schema_registry, DEFAULT_CONNECTION_ID
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_IDLE_TIMEOUT = float(os.getenv("CONNECTION_IDLE_TIMEOUT", "900"))  # Seconds before an idle pool is released
+CONNECTION_EVICT_INTERVAL = float(os.getenv("CONNECTION_EVICT_INTERVAL", "60"))
+
+# Pool settings shared by every engine the registry creates
+ENGINE_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "20")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "40")),
+    "pool_recycle": 180,
+    "pool_pre_ping": True,
+}
+
+
+class _TrackedSession(Session):
+    """Session that tells the registry when it is closed, so open sessions keep their pool alive."""
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            release = self.info.pop("_release", None)
+            if release is not None:
+                release()
+
+
+class _Connection:
+    def __init__(self, engine, url=None):
+        self.engine = engine
+        self.url = url  # None for engines built outside the registry
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=_TrackedSession)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.active = 0  # Sessions handed out and not yet closed
+        self.released = False  # Pool disposed for idleness; reconnects on next use
+
+
+class ConnectionRegistry:
+    """
+    Engines and session factories by connection ID.
+
+    Connecting twice to the same URL reuses the engine; a new URL for an ID
+    disposes the old engine first. Pools idle for longer than ``idle_timeout``
+    are disposed by a background thread, and reopen on their next request.
+    """
+
+    def __init__(self, idle_timeout=CONNECTION_IDLE_TIMEOUT, evict_interval=CONNECTION_EVICT_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.evict_interval = evict_interval
+        self.default_engine_factory = None  # Returns the engine for DEFAULT_CONNECTION_ID on first use
+        self.last_connected = None  # Used when a request names no connection
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._evictor = None
+        self._stop = threading.Event()
+
+    def connect(self, connection_id, url, **engine_options):
+        """Return ``(engine, created)`` for ``connection_id``, creating the engine only if the URL changed."""
+        with self._lock:
+            current = self._connections.get(connection_id)
+            if current is not None and current.url == url:
+                self.last_connected = connection_id
+                return current.engine, False
+            # create_engine does not connect, so it is cheap enough to build under the lock;
+            # concurrent connects with the same URL then share one engine
+            engine = create_engine(url, **{**ENGINE_OPTIONS, **engine_options})
+            previous = self._insert(connection_id, engine, url)
+        if previous is not None:
+            previous.engine.dispose()
+            logger.info(f"Connection '{connection_id}' changed URL, disposed the previous engine")
+        return engine, True
+
+    def add(self, connection_id, engine, url=None):
+        """Register an existing engine; returns the engine it replaced (already disposed), if any."""
+        with self._lock:
+            previous = self._insert(connection_id, engine, url)
+        if previous is not None and previous.engine is not engine:
+            previous.engine.dispose()
+            return previous.engine
+        return None
+
+    def _insert(self, connection_id, engine, url):
+        # Caller holds self._lock
+        previous = self._connections.get(connection_id)
+        self._connections[connection_id] = _Connection(engine, url)
+        if connection_id != DEFAULT_CONNECTION_ID:
+            self.last_connected = connection_id
+        return previous
+
+    def remove(self, connection_id):
+        with self._lock:
+            connection = self._connections.pop(connection_id, None)
+            if self.last_connected == connection_id:
+                self.last_connected = next(
+                    (c for c in reversed(self._connections) if c != DEFAULT_CONNECTION_ID), None
+                )
+        if connection is None:
+            return False
+        connection.engine.dispose()
+        return True
+
+    def resolve(self, connection_id=None):
+        """The ID a request runs against: the one it names, else the last connected, else the default."""
+        return connection_id or self.last_connected or DEFAULT_CONNECTION_ID
+
+    def _get(self, connection_id):
+        connection = self._connections.get(connection_id)
+        if connection is None:
+            if connection_id != DEFAULT_CONNECTION_ID or self.default_engine_factory is None:
+                raise KeyError(f"Unknown connection '{connection_id}'")
+            self.add(connection_id, self.default_engine_factory())
+            connection = self._connections[connection_id]
+        return connection
+
+    def is_released(self, connection_id):
+        """True while the connection's pool is disposed for idleness (until its next session)."""
+        connection = self._connections.get(connection_id)
+        return connection is not None and connection.released
+
+    def engine(self, connection_id):
+        return self._get(connection_id).engine
+
+    def session(self, connection_id):
+        """A new session from the cached factory; ``info['connection_id']`` carries the ID."""
+        self._get(connection_id)
+        with self._lock:
+            # Touched under the lock evict_idle selects under, and counted until the session closes
+            connection = self._connections[connection_id]
+            connection.last_used = time.time()
+            connection.released = False
+            connection.active += 1
+        db = connection.session_factory()
+        db.info["connection_id"] = connection_id
+        db.info["_release"] = lambda: self._release(connection)
+        return db
+
+    def _release(self, connection):
+        with self._lock:
+            connection.active -= 1
+            connection.last_used = time.time()
+
+    def evict_idle(self):
+        """Dispose the pools of connections unused for ``idle_timeout`` with no open session."""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            idle = [
+                (cid, c) for cid, c in self._connections.items()
+                if not c.released and c.active == 0 and c.last_used < cutoff
+                and _pool_stats(c.engine.pool).get("checked_out", 0) == 0
+            ]
+            for _, connection in idle:
+                connection.released = True
+        for connection_id, connection in idle:
+            # A session opened from here on checks out from the fresh pool dispose() leaves behind
+            connection.engine.dispose()
+            logger.info(f"Released idle connection pool '{connection_id}'")
+        return len(idle)
+
+    def _evict_loop(self):
+        while not self._stop.wait(self.evict_interval):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Connection eviction failed: {str(e)}")
+
+    def start_evictor(self):
+        if self._evictor is not None and self._evictor.is_alive():
+            return
+        self._stop.clear()
+        self._evictor = threading.Thread(target=self._evict_loop, name="connection-evictor", daemon=True)
+        self._evictor.start()
+
+    def stop_evictor(self):
+        self._stop.set()
+        if self._evictor is not None:
+            self._evictor.join(timeout=5)
+            self._evictor = None
+
+    def dispose_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+        for connection in connections:
+            connection.engine.dispose()
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            items = list(self._connections.items())
+        return {
+            connection_id: {
+                "dialect": c.engine.dialect.name,
+                "released": c.released,
+                "active_sessions": c.active,
+                "idle_seconds": round(now - c.last_used, 1),
+                **_pool_stats(c.engine.pool),
+            }
+            for connection_id, c in items
+        }
+
+
+def _pool_stats(pool):
+    # QueuePool reports all four; other pool classes (SQLite, NullPool) may not
+    stats = {}
+    for name, attr in (("pool_size", "size"), ("checked_in", "checkedin"),
+                       ("checked_out", "checkedout"), ("overflow", "overflow")):
+        method = getattr(pool, attr, None)
+        if method is not None:
+            try:
+                stats[name] = method()
+            except Exception:
+                pass
+    return stats
+
+
+connection_registry = ConnectionRegistry()
+
+# Schema refreshes must not reopen pools released for idleness
+schema_registry.connection_released = connection_registry.is_released
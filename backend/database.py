@@ -2,19 +2,20 @@
 import logging
 import sys
 import os
+import threading
 from dotenv import load_dotenv
-import pymysql
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine, text
-from  sqlalchemy import inspect
-import json
+from schema_service import schema_registry, DEFAULT_CONNECTION_ID
+from connection_registry import connection_registry
 
 
 def get_db():
     """
     Get database session
     """
-    db = SessionLocal()
+    db = get_session_factory()()
+    db.info["connection_id"] = DEFAULT_CONNECTION_ID
     try:
         yield db
     finally:
@@ -33,27 +34,17 @@ def get_db():
 
 #     return tables_metadata
 
-def get_table_metadata():
-    """Cache schema metadata to a JSON file or Redis."""
-    cache_file = "schema_cache.json"
-
-    # Load from cache if exists
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
-
-    # Fetch metadata from DB
-    inspector = inspect(engine)
-    tables_metadata = {
-        table: [col["name"] for col in inspector.get_columns(table)]
-        for table in inspector.get_table_names()
-    }
+def get_table_metadata(connection_id=None):
+    """
+    Return ``{table: [column, ...]}`` for a connection from the in-memory schema service.
 
-    # Store in cache
-    with open(cache_file, "w") as f:
-        json.dump(tables_metadata, f)
+    The schema is bulk-loaded once per connection and refreshed in the
+    background when DDL is detected, so this does no I/O once warm.
+    """
+    return schema_registry.get(connection_id).tables
 
-    return tables_metadata
+def get_schema_version(connection_id=None):
+    return schema_registry.get(connection_id).version
 
 # Configure logging
 logging.basicConfig(stream=sys.stdout, level=logging.INFO, force=True)
@@ -77,26 +68,61 @@ connection_string = (
     f"@{db_config['db_host']}:{db_config['db_port']}/{db_config['db_name']}"
 )
 
-# Create SQLAlchemy engine
-# Create a connection pool for SQLAlchemy engine
-engine = create_engine(
-    connection_string,
-    pool_size=20,  # Increase to 20 for high concurrency
-    max_overflow=40,  # Allow 40 temporary connections
-    pool_recycle=180,  # Reduce recycle time to 3 min
-    pool_pre_ping=True  # Ensure connection validity
-)
-
-
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Test the connection using raw SQL
-try:
-    with engine.connect() as connection:
-        result = connection.execute(text("SHOW TABLES"))
-        print("✅ Database Connection Successful! Available Tables:")
-        # for row in result:
-        #     print(row)
-except Exception as e:
-    print(f"❌ Database Connection Failed: {str(e)}")
+# The engine is created on first use, not at import, so workers boot even when
+# the database is unreachable; check_connection() runs during warm-up instead
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # Create a connection pool for SQLAlchemy engine
+                _engine = create_engine(
+                    connection_string,
+                    pool_size=20,  # Increase to 20 for high concurrency
+                    max_overflow=40,  # Allow 40 temporary connections
+                    pool_recycle=180,  # Reduce recycle time to 3 min
+                    pool_pre_ping=True  # Ensure connection validity
+                )
+    return _engine
+
+
+def get_session_factory():
+    global _session_factory
+    if _session_factory is None:
+        # Create session factory
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+    return _session_factory
+
+
+def __getattr__(name):
+    # ``database.engine`` / ``database.SessionLocal`` still work, created on first access
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# The schema service and pooled sessions for the default connection are created on first use
+schema_registry.default_engine_factory = get_engine
+connection_registry.default_engine_factory = get_engine
+
+
+def check_connection():
+    """Test the connection using raw SQL; returns the number of tables."""
+    try:
+        with get_engine().connect() as connection:
+            result = connection.execute(text("SHOW TABLES"))
+            tables = result.fetchall()
+            print("✅ Database Connection Successful! Available Tables:")
+            # for row in result:
+            #     print(row)
+            return len(tables)
+    except Exception as e:
+        print(f"❌ Database Connection Failed: {str(e)}")
+        raise
@@ -0,0 +1,148 @@
+import datetime
+import decimal
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Column kinds derived once per result; they decide how a column is decoded
+INT, FLOAT, DECIMAL, BOOL, DATETIME, DATE, STRING, BYTES, JSON, OBJECT = (
+    "int", "float", "decimal", "bool", "datetime", "date", "string", "bytes", "json", "object"
+)
+
+# pymysql FIELD_TYPE codes
+MYSQL_TYPE_KINDS = {
+    0: DECIMAL, 246: DECIMAL,
+    1: INT, 2: INT, 3: INT, 8: INT, 9: INT, 13: INT,
+    4: FLOAT, 5: FLOAT,
+    7: DATETIME, 12: DATETIME,
+    10: DATE, 14: DATE,
+    15: STRING, 247: STRING, 248: STRING, 253: STRING, 254: STRING,
+    249: BYTES, 250: BYTES, 251: BYTES, 252: BYTES, 16: BYTES,
+    245: JSON,
+}
+
+# PostgreSQL type OIDs (psycopg2 / psycopg)
+POSTGRES_TYPE_KINDS = {
+    16: BOOL,
+    20: INT, 21: INT, 23: INT,
+    700: FLOAT, 701: FLOAT,
+    1700: DECIMAL,
+    1114: DATETIME, 1184: DATETIME,
+    1082: DATE,
+    25: STRING, 1042: STRING, 1043: STRING, 19: STRING,
+    17: BYTES,
+    114: JSON, 3802: JSON,
+}
+
+DIALECT_TYPE_KINDS = {"mysql": MYSQL_TYPE_KINDS, "mariadb": MYSQL_TYPE_KINDS, "postgresql": POSTGRES_TYPE_KINDS}
+
+# Kinds that decode to float64 columns
+_NUMERIC_KINDS = (INT, FLOAT, DECIMAL)
+
+
+def _python_kind(value):
+    """Kind of a single Python value, for drivers whose description carries no type codes."""
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, decimal.Decimal):
+        return DECIMAL
+    if isinstance(value, datetime.datetime):
+        return DATETIME
+    if isinstance(value, datetime.date):
+        return DATE
+    if isinstance(value, str):
+        return STRING
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return BYTES
+    if isinstance(value, (dict, list)):
+        return JSON
+    return OBJECT
+
+
+def column_kinds(description, dialect_name, rows):
+    """
+    Kind of every result column from ``cursor.description`` type codes.
+
+    Columns the driver does not describe (SQLite, unknown codes) fall back to
+    the Python type of their first non-null value.
+    """
+    type_kinds = DIALECT_TYPE_KINDS.get(dialect_name, {})
+    kinds = []
+    for position, column in enumerate(description or ()):
+        kind = type_kinds.get(column[1])
+        if kind is None:
+            first = next((row[position] for row in rows if row[position] is not None), None)
+            kind = OBJECT if first is None else _python_kind(first)
+        kinds.append(kind)
+    return kinds
+
+
+def _decode_column(values, kind):
+    if kind in _NUMERIC_KINDS:
+        if kind == INT and None not in values:
+            try:
+                return np.array(values, dtype=np.int64)
+            except OverflowError:
+                pass  # UNSIGNED BIGINT beyond int64
+        # None becomes NaN; Decimal converts through float
+        return np.array(values, dtype=np.float64)
+    if kind == DATETIME:
+        # Aware values with different UTC offsets only share a dtype once converted to UTC
+        aware = any(getattr(v, "tzinfo", None) is not None for v in values)
+        try:
+            return pd.to_datetime(pd.Series(values, dtype=object), utc=aware)
+        except (ValueError, TypeError, OverflowError):
+            pass  # Out-of-range or unparsable values stay as they are in an object column
+    if kind == BOOL and None not in values:
+        return np.array(values, dtype=bool)
+    if kind == JSON:
+        # Nested values are flattened to text once, here, instead of per cell at render time
+        return np.array([v if v is None or isinstance(v, str) else str(v) for v in values], dtype=object)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def decode_frame(query_result: dict) -> pd.DataFrame:
+    """Build a typed DataFrame from a query result's row tuples and column kinds, one column at a time."""
+    columns = query_result["columns"]
+    rows = query_result["rows"]
+    kinds = query_result.get("column_types") or [OBJECT] * len(columns)
+    if not rows:
+        return pd.DataFrame(columns=columns)
+    transposed = list(zip(*rows))
+    return pd.DataFrame(
+        {name: _decode_column(list(values), kind) for name, values, kind in zip(columns, transposed, kinds)},
+        columns=columns,
+    )
+
+
+def frame_records(df: pd.DataFrame, missing=None) -> list:
+    """
+    ``df`` as a list of JSON-safe row dicts.
+
+    NaN/None become ``missing`` and ±inf become None, decided with one
+    vectorized mask per column rather than a pass over every cell.
+    """
+    data = {}
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_float_dtype(series):
+            values = series.to_numpy()
+            column = values.astype(object)
+            column[np.isnan(values)] = missing
+            column[np.isinf(values)] = None
+        elif pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+            column = series.to_numpy(dtype=object)
+        else:
+            column = series.to_numpy(dtype=object, copy=True)
+            column[pd.isna(column)] = missing
+        data[name] = column
+    return [dict(zip(data, row)) for row in zip(*data.values())]
@@ -0,0 +1,292 @@
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from decoding import OBJECT
+
+logger = logging.getLogger(__name__)
+
+# Point budgets per chart type
+LINE_POINT_BUDGET = int(os.getenv("CHART_LINE_POINTS", "2000"))
+BAR_POINT_BUDGET = int(os.getenv("CHART_BAR_POINTS", "50"))
+PIE_SLICE_BUDGET = int(os.getenv("CHART_PIE_SLICES", "12"))
+LINE_DOWNSAMPLE_METHOD = os.getenv("CHART_LINE_DOWNSAMPLE", "lttb")  # "lttb" or "minmax"
+CHART_PUSHDOWN = os.getenv("CHART_PUSHDOWN", "true").lower() in ("1", "true", "yes")
+
+OTHER_LABEL = "Other"
+OTHER_FLAG = "_other"  # Marks the aggregated remainder row in pushed-down bar/pie results
+
+
+def chart_budget(chart_type: str) -> int:
+    return {"line_chart": LINE_POINT_BUDGET, "bar_chart": BAR_POINT_BUDGET, "pie_chart": PIE_SLICE_BUDGET}[chart_type]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of ``threshold`` points that keep
+    the visual shape of the series. ``x`` must be numeric and sorted.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # bucket boundaries for the middle points
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle vertex
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        bx, by = x[start:end], y[start:end]
+        areas = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.nanargmax(areas)) if np.isfinite(areas).any() else start
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_buckets(y, n_buckets):
+    """Indices of the min and max point in each of ``n_buckets`` equal-count buckets, in order."""
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    picks = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        segment = y[start:end]
+        if not np.isfinite(segment).any():
+            picks.append(start)
+            continue
+        picks.extend({start + int(np.nanargmin(segment)), start + int(np.nanargmax(segment))})
+    return np.array(sorted(picks))
+
+
+def top_n_other(df, n, keep_order=False):
+    """Keep the ``n`` largest rows by the value column and sum the rest into an "Other" row."""
+    x_col, y_col = df.columns[:2]
+    if len(df) <= n:
+        return df
+    values = pd.to_numeric(df[y_col], errors="coerce")
+    top_index = values.nlargest(n).index
+    top = df.loc[top_index.sort_values()] if keep_order else df.loc[top_index]
+    rest = values.drop(top_index).sum()
+    other = pd.DataFrame({x_col: [OTHER_LABEL], y_col: [rest]})
+    return pd.concat([top[[x_col, y_col]], other], ignore_index=True)
+
+
+def _numeric_axis(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype("int64").to_numpy()
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=float)
+    return None
+
+
+def reduce_for_chart(df, chart_type, budget=None):
+    """
+    Shrink a result to what a chart can usefully show.
+
+    Line charts are downsampled with LTTB (or min/max buckets); bar and pie
+    charts keep the top-N categories and fold the remainder into "Other".
+    Returns the (possibly unchanged) frame and a description of what was done.
+    """
+    budget = budget or chart_budget(chart_type)
+    if len(df) <= budget:
+        return df, None
+
+    x_col, y_col = df.columns[:2]
+    original = len(df)
+    if chart_type == "line_chart":
+        x = _numeric_axis(df[x_col])
+        if x is not None and not pd.Series(x).is_monotonic_increasing:
+            order = np.argsort(x, kind="stable")
+            df, x = df.iloc[order], x[order]
+        y = pd.to_numeric(df[y_col], errors="coerce").to_numpy(dtype=float)
+        if LINE_DOWNSAMPLE_METHOD == "minmax":
+            indices = minmax_buckets(y, budget // 2)
+            method = "minmax"
+        else:
+            indices = lttb(x if x is not None else np.arange(len(df)), y, budget)
+            method = "lttb"
+        reduced = df.iloc[indices].reset_index(drop=True)
+    else:
+        # Leave room for the "Other" row inside the budget
+        reduced = top_n_other(df, budget - 1, keep_order=chart_type == "bar_chart")
+        method = "top_n_other"
+
+    logger.info(f"Reduced {chart_type} from {original} to {len(reduced)} points ({method})")
+    return reduced, {"method": method, "original_points": original, "points": len(reduced)}
+
+
+_SINGLE_SELECT_RE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_TRAILING_LIMIT_RE = re.compile(r"\blimit\s+(\d+)\s*(offset\s+\d+\s*)?$", re.IGNORECASE)
+# Quoted strings and identifiers are skipped when looking for the top-level ORDER BY
+_ORDER_TOKEN_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|\(|\)|,|\border\s+by\b", re.IGNORECASE)
+_ORDER_KEY_RE = re.compile(
+    r'^\s*(?:[\w$]+\.)*("[^"]+"|`[^`]+`|[\w$]+)\s*(asc|desc)?\s*(nulls\s+(?:first|last))?\s*$', re.IGNORECASE
+)
+
+
+def _supports_window_functions(dialect):
+    """MySQL before 8.0, MariaDB before 10.2 and SQLite before 3.25 have no window functions."""
+    version = tuple(getattr(dialect, "server_version_info", None) or ())
+    if dialect.name == "mariadb" or getattr(dialect, "is_mariadb", False):
+        return version >= (10, 2)
+    if dialect.name == "mysql":
+        return version >= (8,)
+    if dialect.name == "sqlite":
+        return version >= (3, 25)
+    return True
+
+
+def _order_keys(body, columns, quote):
+    """
+    The top-level ORDER BY of ``body`` rewritten against its output columns,
+    or None when there is none or a key is not a plain output column/position.
+    """
+    body = _TRAILING_LIMIT_RE.sub("", body).rstrip()
+    depth, start, commas = 0, None, []
+    for match in _ORDER_TOKEN_RE.finditer(body):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token == ",":
+            commas.append(match.start())
+        elif depth == 0 and token.lower().startswith("order"):
+            start, commas = match.end(), []
+    if start is None:
+        return None
+
+    keys = []
+    bounds = [start] + [c + 1 for c in commas]
+    for begin, end in zip(bounds, commas + [len(body)]):
+        match = _ORDER_KEY_RE.match(body[begin:end])
+        if not match:
+            return None
+        name, direction, nulls = match.groups()
+        if name.isdigit():
+            if not 1 <= int(name) <= len(columns):
+                return None
+            name = columns[int(name) - 1]
+        else:
+            name = name.strip('"`')
+            if name not in columns:
+                return None
+        keys.append(" ".join(part for part in (quote(name), direction, nulls) if part))
+    return ", ".join(keys)
+
+
+def chart_count_probe(sql, budget):
+    """
+    SQL counting the rows of ``sql`` up to ``budget + 1``, enough to tell
+    whether the chart needs reducing without reading the whole result.
+    None when ``sql`` is not a single SELECT.
+    """
+    body = sql.strip().rstrip(";").strip()
+    if ";" in body or not _SINGLE_SELECT_RE.match(body):
+        return None
+    return f"SELECT COUNT(*) FROM (SELECT 1 AS _one FROM ({body}) AS _q LIMIT {int(budget) + 1}) AS _n"
+
+
+def pushdown_chart_reduction(db, sql, chart_type, budget=None, columns=None):
+    """
+    Rewrite ``sql`` so the database returns an already-reduced chart series.
+    Meant for results known to exceed the budget (see ``execute_chart_query``).
+
+    Bar/pie: top-N by value plus one aggregated row flagged in ``OTHER_FLAG``
+    (see ``label_other_rows``); x values keep their type, bar charts keep the
+    query's order of categories and pie charts go largest first, like
+    ``top_n_other``. Line: NTILE buckets over the x axis, averaging y within
+    each bucket. ``columns`` are the result's column names; without them a
+    ``LIMIT 0`` probe reads them. Returns the original SQL when the query is
+    not a single SELECT, the probe fails or the server has no window
+    functions; the caller then reduces in memory.
+    """
+    budget = budget or chart_budget(chart_type)
+    body = sql.strip().rstrip(";").strip()
+    if ";" in body or not _SINGLE_SELECT_RE.match(body):
+        return sql
+    limit = _TRAILING_LIMIT_RE.search(body)
+    if limit and int(limit.group(1)) <= budget:
+        return sql  # Already small enough
+    dialect = db.get_bind().dialect
+    if not _supports_window_functions(dialect):
+        logger.info(f"Chart pushdown skipped, {dialect.name} {dialect.server_version_info} has no window functions")
+        return sql
+
+    if columns is None:
+        try:
+            # Column names of the result, without fetching any rows
+            columns = list(db.execute(text(f"SELECT * FROM ({body}) AS _probe LIMIT 0")).keys())
+        except Exception as e:
+            logger.info(f"Chart pushdown skipped, probe failed: {str(e)}")
+            db.rollback()
+            return sql
+    if len(columns) < 2 or columns[0] == columns[1]:
+        return sql
+
+    quote = dialect.identifier_preparer.quote
+    x, y = quote(columns[0]), quote(columns[1])
+
+    if chart_type == "line_chart":
+        return (
+            f"SELECT MIN({x}) AS {x}, AVG({y}) AS {y} FROM ("
+            f"SELECT {x}, {y}, NTILE({int(budget)}) OVER (ORDER BY {x}) AS _bucket FROM ({body}) AS _q"
+            f") AS _r GROUP BY _bucket ORDER BY _bucket"
+        )
+
+    top_n = int(budget) - 1
+    # _pos is the row's position in the query's own output. A derived table's ORDER BY does not
+    # carry over to the outer query, so the window repeats it (largest values first without one)
+    by_value = f"CASE WHEN {y} IS NULL THEN 1 ELSE 0 END, {y} DESC"
+    position = _order_keys(body, columns, quote) or by_value
+    # Ties and NULL values rank like nlargest
+    ranked = (
+        f"SELECT {x}, {y}, _pos, ROW_NUMBER() OVER (ORDER BY {by_value}, _pos) AS _rank FROM ("
+        f"SELECT {x}, {y}, ROW_NUMBER() OVER (ORDER BY {position}) AS _pos FROM ({body}) AS _q) AS _p"
+    )
+    is_other = f"CASE WHEN MIN(_rank) > {top_n} THEN 1 ELSE 0 END"
+    order = "MIN(_pos)" if chart_type == "bar_chart" else "MIN(_rank)"
+    return (
+        f"SELECT MIN(CASE WHEN _rank <= {top_n} THEN {x} END) AS {x}, SUM({y}) AS {y}, {is_other} AS {OTHER_FLAG} "
+        f"FROM ({ranked}) AS _r GROUP BY CASE WHEN _rank <= {top_n} THEN _rank ELSE 0 END "
+        f"ORDER BY {is_other}, {order}"
+    )
+
+
+def label_other_rows(query_result):
+    """
+    Turn the flagged row of a pushed-down bar/pie result into the "Other"
+    category and drop the flag column. Returns a new result dict.
+    """
+    columns = query_result["columns"]
+    if OTHER_FLAG not in columns:
+        return query_result
+    flag = columns.index(OTHER_FLAG)
+    rows = []
+    has_other = False
+    for row in query_result["rows"]:
+        if row[flag]:
+            has_other = True
+            row = (OTHER_LABEL,) + tuple(row[1:])
+        rows.append(tuple(row[:flag]) + tuple(row[flag + 1:]))
+    kinds = list(query_result.get("column_types") or ())
+    if kinds:
+        del kinds[flag]
+        if has_other:
+            kinds[0] = OBJECT  # Mixed: the original x values plus the "Other" label
+    return {
+        **query_result, "rows": rows, "columns": columns[:flag] + columns[flag + 1:],
+        "column_types": kinds, "rowcount": len(rows),
+    }
@@ -0,0 +1,81 @@
+import hashlib
+import logging
+import re
+
+import numpy as np
+
+from instrumentation import record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+class OpenAIEmbedder:
+    """Embeds texts with the OpenAI embeddings API, many strings per request."""
+
+    def __init__(self, model="text-embedding-ada-002", batch_size=512, client=None):
+        self.model = model
+        self.batch_size = batch_size
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI()
+        return self._client
+
+    def embed(self, texts):
+        """Return a float32 matrix with one row per text."""
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            response = self.client.embeddings.create(input=batch, model=self.model)
+            record_llm_usage(self.model, response.usage, "embed")
+            # The API may return items out of order; each carries its input index
+            for item in sorted(response.data, key=lambda d: d.index):
+                rows.append(item.embedding)
+            logger.info(f"Embedded {min(start + self.batch_size, len(texts))}/{len(texts)} texts")
+        return np.asarray(rows, dtype=np.float32).reshape(len(rows), -1)
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder (feature hashing of words and character trigrams).
+
+    Needs no network or model files, so index builds and lookups can run offline
+    and in tests; similar identifiers still land close to each other.
+    """
+
+    def __init__(self, dim=256, model="local-hashing"):
+        self.dim = dim
+        self.model = f"{model}-{dim}"
+
+    def _features(self, text):
+        words = _TOKEN_RE.findall(_CAMEL_RE.sub(" ", text).lower())
+        for word in words:
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.md5(feature.encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                matrix[row, bucket] += sign * weight
+        return matrix
+
+
+def get_embedder(provider="openai", **kwargs):
+    """Create an embedder by name: ``openai`` or ``hashing`` (offline stub)."""
+    if provider == "openai":
+        return OpenAIEmbedder(**kwargs)
+    if provider == "hashing":
+        return HashingEmbedder(**{k: v for k, v in kwargs.items() if k in ("dim",)})
+    raise ValueError(f"Unknown embedding provider '{provider}'. Expected 'openai' or 'hashing'.")
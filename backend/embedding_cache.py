@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Content address of an embedding: hash of (model, text)."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-process LRU in front of a SQLite file.
+
+    The SQLite tier runs in WAL mode so several uvicorn workers can share one
+    file; vectors are stored as raw float32 bytes. Like the memory tier it is
+    bounded: each write drops rows unused for ``disk_ttl`` seconds, then the
+    least recently used rows above ``max_disk_rows`` (0 disables either).
+    """
+
+    def __init__(self, path=None, max_memory_entries=10000, max_disk_rows=200000, disk_ttl=30 * 86400):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_rows = max_disk_rows
+        self.disk_ttl = disk_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        # The SQLite file is opened (and created) on first use or by ensure_ready(), never at construction
+
+    def ensure_ready(self):
+        """Open this thread's connection, creating the file and table if needed (warm-up)."""
+        if self.path:
+            self._connection()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL, "
+                "last_used REAL NOT NULL DEFAULT 0)"
+            )
+            if "last_used" not in {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}:
+                # Files written before the disk tier was bounded
+                conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE embeddings SET last_used = created_at")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, model, texts):
+        """Return a list aligned with ``texts``: cached vectors, or None for misses."""
+        keys = [embedding_key(model, t) for t in texts]
+        found = [None] * len(texts)
+        pending = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.memory_hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+
+        if pending and self.path:
+            try:
+                rows = self._fetch(list(pending))
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache read failed: {str(e)}")
+                rows = []
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, vector)
+                for i in pending.pop(key):
+                    found[i] = vector
+                    self.disk_hits += 1
+
+        self.misses += sum(len(v) for v in pending.values())
+        return found
+
+    def _fetch(self, keys):
+        conn = self._connection()
+        rows = []
+        now = time.time()
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            found = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk).fetchall()
+            if found:
+                # Disk hits count as uses for the LRU bound
+                hit_keys = [key for key, _ in found]
+                conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                    [now, *hit_keys],
+                )
+            rows.extend(found)
+        conn.commit()
+        return rows
+
+    def _prune(self, conn):
+        """Drop expired rows, then the least recently used ones above ``max_disk_rows``."""
+        removed = 0
+        if self.disk_ttl:
+            removed += conn.execute("DELETE FROM embeddings WHERE last_used < ?", (time.time() - self.disk_ttl,)).rowcount
+        if self.max_disk_rows:
+            surplus = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_disk_rows
+            if surplus > 0:
+                removed += conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (surplus,),
+                ).rowcount
+        if removed:
+            self.disk_evictions += removed
+            logger.info(f"Embedding cache pruned {removed} rows from {self.path}")
+
+    def put_many(self, model, texts, vectors):
+        entries = []
+        now = time.time()
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            key = embedding_key(model, text)
+            self._remember(key, vector)
+            entries.append((key, model, vector.tobytes(), now, now))
+        if entries and self.path:
+            try:
+                conn = self._connection()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, model, vector, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    entries,
+                )
+                self._prune(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache write failed: {str(e)}")
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "disk_evictions": self.disk_evictions,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+class CachedEmbedder:
+    """Wraps an embedder so each (model, text) pair is only ever embedded once."""
+
+    def __init__(self, embedder, cache):
+        self.embedder = embedder
+        self.cache = cache
+        self.model = embedder.model
+
+    def embed(self, texts):
+        vectors = self.cache.get_many(self.model, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = self.embedder.embed(missing)
+            self.cache.put_many(self.model, missing, fresh)
+            by_text = dict(zip(missing, fresh))
+            vectors = [by_text[t] if v is None else v for t, v in zip(texts, vectors)]
+        return np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "embedding_index")
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        norm = np.linalg.norm(matrix)
+        return matrix / norm if norm else matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingIndex:
+    """
+    Pre-normalized float32 embedding matrix with a name for every row.
+
+    Rows can be partitioned into contiguous groups (columns grouped by table),
+    so a lookup inside one group is a slice of the matrix. On disk an index is
+    ``<name>.npy`` (memory-mapped on load) plus ``<name>.json`` holding the row
+    names, group offsets and build metadata.
+    """
+
+    def __init__(self, names, matrix, groups=None, meta=None):
+        self.names = list(names)
+        self.matrix = matrix
+        self.groups = groups or {}  # group -> [start, end)
+        self.meta = meta or {}
+        # Hashed lowercase name index for exact matches: (group, lower name) -> name
+        self._exact = {}
+        if self.groups:
+            for group, (start, end) in self.groups.items():
+                for name in self.names[start:end]:
+                    self._exact.setdefault((group, name.lower()), name)
+        else:
+            for name in self.names:
+                self._exact.setdefault((None, name.lower()), name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, group):
+        return group in self.groups
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    @classmethod
+    def empty(cls):
+        return cls([], np.empty((0, 0), dtype=np.float32))
+
+    @classmethod
+    def from_mapping(cls, mapping, meta=None):
+        """Build from ``{name: vector}``, or ``{group: {name: vector}}`` for a grouped index."""
+        names, vectors, groups = [], [], {}
+        grouped = any(isinstance(v, dict) for v in mapping.values())
+        if grouped:
+            for group in sorted(mapping):
+                start = len(names)
+                for name, vector in mapping[group].items():
+                    names.append(name)
+                    vectors.append(vector)
+                groups[group] = [start, len(names)]
+        else:
+            for name, vector in mapping.items():
+                names.append(name)
+                vectors.append(vector)
+        if not vectors:
+            return cls([], np.empty((0, 0), dtype=np.float32), groups, meta)
+        return cls(names, normalize_rows(np.vstack(vectors)), groups, meta)
+
+    def exact(self, name, group=None):
+        return self._exact.get((group, name.lower()))
+
+    def group_names(self, group):
+        start, end = self.groups[group]
+        return self.names[start:end]
+
+    def group_matrix(self, group):
+        start, end = self.groups[group]
+        return self.matrix[start:end]
+
+    def scores(self, vector, group=None):
+        """Cosine similarity of ``vector`` against every row (or every row of ``group``)."""
+        matrix = self.matrix if group is None else self.group_matrix(group)
+        if not len(matrix):
+            return np.empty(0, dtype=np.float32)
+        return matrix @ normalize_rows(vector)
+
+    def top_k(self, vector, k=1, group=None):
+        """Return up to ``k`` ``(name, score)`` pairs, best first."""
+        scores = self.scores(vector, group)
+        if not len(scores):
+            return []
+        offset = self.groups[group][0] if group is not None else 0
+        k = min(k, len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self.names[offset + i], float(scores[i])) for i in candidates]
+
+    def save(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        npy_path = os.path.join(directory, f"{name}.npy")
+        meta_path = os.path.join(directory, f"{name}.json")
+        # Write to temporary files first so readers never see a half-written index
+        with open(f"{npy_path}.tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump({"names": self.names, "groups": self.groups, "meta": self.meta}, f)
+        os.replace(f"{npy_path}.tmp", npy_path)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    @classmethod
+    def load(cls, directory, name, mmap=True):
+        npy_path = os.path.join(directory, f"{name}.npy")
+        meta_path = os.path.join(directory, f"{name}.json")
+        if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        matrix = np.load(npy_path, mmap_mode="r" if mmap else None)
+        return cls(meta["names"], matrix, {g: tuple(r) for g, r in meta["groups"].items()}, meta.get("meta"))
+
+
+def load_legacy_json(path):
+    """Read the old JSON-of-lists embeddings file, ignoring the empty placeholder layout."""
+    with open(path, "r") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Error decoding {path}: {str(e)}")
+    if not isinstance(data, dict):
+        raise TypeError(f"Expected {path} to contain a dictionary, but got {type(data)}")
+    # Placeholder files only carry empty "tables"/"columns"/"embeddings" sections
+    if set(data) <= {"tables", "columns", "embeddings"} and not any(data.values()):
+        return {}
+    return data
+
+
+def load_index(name, directory=EMBEDDING_INDEX_DIR, legacy_json=None):
+    """
+    Load the named index, memory-mapped.
+
+    If only a legacy ``*_embeddings.json`` file exists it is converted once and
+    saved in the index format. A missing index loads as empty.
+    """
+    index = EmbeddingIndex.load(directory, name)
+    if index is not None:
+        logger.info(f"Loaded embedding index '{name}' with {len(index)} rows")
+        return index
+    if legacy_json and os.path.exists(legacy_json):
+        index = EmbeddingIndex.from_mapping(load_legacy_json(legacy_json), meta={"source": legacy_json})
+        if len(index):
+            index.save(directory, name)
+            logger.info(f"Converted {legacy_json} to embedding index '{name}' ({len(index)} rows)")
+            return EmbeddingIndex.load(directory, name)
+        return index
+    logger.info(f"Embedding index '{name}' not found in {directory}; starting empty")
+    return EmbeddingIndex.empty()
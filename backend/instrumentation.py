@@ -0,0 +1,182 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "ai_data_analyst"
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))  # Share of requests logging sample rows
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "500"))  # Longest payload excerpt written to the log
+LOG_SAMPLE_ROWS = 3
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stage durations (ms) of the request being handled; run_blocking copies the
+# context into worker threads, so spans recorded there land in the same dict
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Metrics:
+    """Process-local counters and latency histograms, exported in Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}  # stage -> [bucket counts..., +Inf count, sum]
+        self._counters = {}  # (name, sorted label items) -> value
+        self._collectors = {}  # name -> callable returning a stats dict, read at scrape time
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[len(self.buckets)] += 1
+            histogram[-1] += seconds
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_collector(self, name, collect):
+        """Export the numeric values of ``collect()`` (e.g. a cache's ``stats()``) as gauges named ``<name>_<key>``."""
+        self._collectors[name] = collect
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+            counters = dict(self._counters)
+
+        metric = f"{METRICS_PREFIX}_stage_duration_seconds"
+        lines.append(f"# HELP {metric} Time spent per request stage.")
+        lines.append(f"# TYPE {metric} histogram")
+        for stage, histogram in sorted(histograms.items()):
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram[len(self.buckets)]}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram[-1]:.6f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {histogram[len(self.buckets)]}')
+
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+
+        for name, collect in sorted(self._collectors.items()):
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector '{name}' failed: {str(e)}")
+                continue
+            lines.extend(_gauge_lines(f"{METRICS_PREFIX}_{name}", stats))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _gauge_lines(prefix, stats, labels=""):
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            lines.append(f"{prefix}_{key}{{{labels}}} {value}" if labels else f"{prefix}_{key} {value}")
+        elif isinstance(value, dict) and all(isinstance(v, dict) for v in value.values()):
+            # Per-entity stats, e.g. one dict per connection: {"db1": {"checked_out": 2}}
+            for entity, entity_stats in value.items():
+                lines.extend(_gauge_lines(f"{prefix}_{key}", entity_stats, f'id="{_escape(entity)}"'))
+    return lines
+
+
+metrics = Metrics()
+
+
+def start_request_timings():
+    """Start collecting stage timings for the current request; returns the dict they are written to."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def current_timings():
+    return _request_timings.get()
+
+
+def record_stage(stage, seconds):
+    metrics.observe(stage, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        # Repeated stages (e.g. chart pushdown then fallback) add up
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def span(stage):
+    """Time a block as ``stage``, in the request's timings and the latency histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+async def timed_stage(stage, awaitable):
+    """Await ``awaitable`` as the span ``stage``."""
+    with span(stage):
+        return await awaitable
+
+
+def server_timing_header(timings) -> str:
+    """``Server-Timing`` value, e.g. ``classify;dur=12.5, execute;dur=80.1``."""
+    return ", ".join(f"{stage};dur={duration}" for stage, duration in timings.items())
+
+
+def record_llm_usage(model, usage, call):
+    """Count prompt/completion tokens from an OpenAI response's ``usage``."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    metrics.inc("llm_requests", call=call, model=model)
+    metrics.inc("llm_tokens", prompt, call=call, model=model, kind="prompt")
+    if completion:
+        metrics.inc("llm_tokens", completion, call=call, model=model, kind="completion")
+    # Prompt-cache hits (reported as cached_tokens on recent models)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    if cached:
+        metrics.inc("llm_tokens", cached, call=call, model=model, kind="cached_prompt")
+
+
+def summarize_result(query_result) -> str:
+    """
+    Short log line for a query result: shape always, a few sample rows on a
+    sampled share of requests, never more than LOG_PAYLOAD_CHARS characters.
+    """
+    if not query_result.get("success"):
+        return f"error={truncate(query_result.get('error'))}"
+    summary = f"rows={query_result.get('rowcount')} columns={query_result.get('columns')}"
+    if query_result.get("rows") and random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        summary += f" sample={query_result['rows'][:LOG_SAMPLE_ROWS]}"
+    return truncate(summary)
+
+
+def truncate(value, limit=LOG_PAYLOAD_CHARS) -> str:
+    value = str(value)
+    return value if len(value) <= limit else f"{value[:limit]}... ({len(value)} chars)"
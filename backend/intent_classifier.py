@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+
+# Messages that are generic on their own, whatever the schema looks like.
+# Matched against the lowercased message with punctuation and apostrophes removed.
+GENERIC_PATTERNS = [
+    re.compile(p) for p in (
+        r"(hi|hello|hey|hiya|yo|greetings|good (morning|afternoon|evening|day))( there| all| team)?",
+        r"(thanks|thank you|thx|ty|cheers|thanks a lot|thank you so much|much appreciated)",
+        r"(bye|goodbye|see you|see ya|later|good night)",
+        r"(ok|okay|cool|great|nice|awesome|got it|sounds good|perfect|alright)",
+        r"(who|what) are you",
+        r"what can you do|how can you help( me)?|help",
+        r"how are you( doing)?|hows it going|whats up|sup",
+        r"(are you|r u) (a )?(bot|human|ai|real)",
+        r"what is your name|whats your name",
+    )
+]
+
+# Words that signal a data question even when no schema term is mentioned
+ANALYTIC_TERMS = {
+    "count", "total", "sum", "average", "avg", "mean", "median", "max", "maximum", "min", "minimum",
+    "top", "bottom", "list", "show", "display", "how", "many", "much", "number", "trend", "compare",
+    "distribution", "breakdown", "group", "per", "by", "rank", "highest", "lowest", "most", "least",
+    "monthly", "weekly", "daily", "yearly", "quarter", "quarterly", "last", "between", "growth",
+    "percentage", "percent", "ratio", "rate", "revenue", "sales", "orders", "customers", "chart",
+}
+
+STOPWORDS = {
+    "the", "a", "an", "of", "in", "on", "for", "to", "and", "or", "is", "are", "was", "be", "me", "my",
+    "i", "you", "it", "this", "that", "with", "at", "from", "all", "what", "which", "who", "do", "does",
+    "can", "please", "id", "name", "type", "status", "date",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_APOSTROPHE_RE = re.compile(r"['\u2019]")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens, splitting camelCase and snake_case identifiers."""
+    return _TOKEN_RE.findall(_CAMEL_RE.sub(" ", text).lower())
+
+
+def schema_vocabulary(tables_metadata: dict) -> set:
+    """Collect the distinctive words used in table and column names."""
+    vocabulary = set()
+    for table, columns in tables_metadata.items():
+        names = [table] + [c["name"] if isinstance(c, dict) else c for c in columns]
+        for name in names:
+            vocabulary.update(t for t in tokenize(str(name)) if len(t) > 2 and t not in STOPWORDS)
+    return vocabulary
+
+
+class LocalIntentClassifier:
+    """
+    Zero-network classifier for the obvious cases of ``is_generic_message``.
+
+    ``classify`` returns ``(label, confidence)`` with label "YES" (generic) or
+    "NO" (analytic); callers fall back to the LLM below ``threshold``.
+    """
+
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+        self._vocabularies = {}  # schema version -> vocabulary
+        self._lock = threading.Lock()
+        self.counters = {"local_generic": 0, "local_analytic": 0, "llm_fallback": 0}
+
+    def vocabulary(self, tables_metadata, version):
+        """Return the vocabulary for a schema version, building it the first time that version is seen."""
+        vocabulary = self._vocabularies.get(version)
+        if vocabulary is None:
+            vocabulary = schema_vocabulary(tables_metadata)
+            with self._lock:
+                if len(self._vocabularies) >= 32:
+                    self._vocabularies.pop(next(iter(self._vocabularies)))
+                self._vocabularies[version] = vocabulary
+        return vocabulary
+
+    def classify(self, message: str, vocabulary=frozenset()):
+        normalized = " ".join(_TOKEN_RE.findall(_APOSTROPHE_RE.sub("", message.lower())))
+        if not normalized:
+            return "YES", 0.9
+
+        tokens = tokenize(message)
+        schema_hits = sum(1 for t in set(tokens) if t in vocabulary)
+        analytic_hits = sum(1 for t in set(tokens) if t in ANALYTIC_TERMS)
+
+        if any(p.fullmatch(normalized) for p in GENERIC_PATTERNS):
+            # The whole message is the greeting, so its words ("how" in "how are you") are not
+            # analytic terms; only a schema name spelled the same way keeps it out of this path
+            if schema_hits == 0:
+                return "YES", 0.99
+
+        analytic_score = min(1.0, 0.4 * schema_hits + 0.25 * analytic_hits)
+        if analytic_score > 0:
+            return "NO", analytic_score
+
+        # No schema or analytic vocabulary at all: short messages are almost always chatter
+        if len(tokens) <= 3:
+            return "YES", 0.7
+        return "NO", 0.3
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.counters.values())
+            skipped = self.counters["local_generic"] + self.counters["local_analytic"]
+            return {
+                **self.counters,
+                "llm_skip_ratio": skipped / total if total else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+local_classifier = LocalIntentClassifier(
+    threshold=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8")),
+)
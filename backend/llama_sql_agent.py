@@ -1,17 +1,22 @@
-from fastapi import logger
-import openai
+from fastapi.logger import logger
 import os
+import threading
 from dotenv import load_dotenv
-from database import get_table_metadata
-from functools import lru_cache
+from database import get_table_metadata, get_schema_version, DEFAULT_CONNECTION_ID
+from schema_service import schema_registry
+from semantic_cache import SemanticSQLCache
+from intent_classifier import local_classifier
 # import redis
 # cache = redis.Redis(host='localhost', port=6379, db=0)
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import json
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
 import regex as re
+from embedding_index import load_index
+from embedders import get_embedder
+from schema_pruning import prune_schema, estimate_tokens, SCHEMA_PRUNING
+from prompt_builder import build_sql_messages, encode_schema, uses_stable_prefix
+from embedding_cache import EmbeddingCache, CachedEmbedder
+from instrumentation import record_llm_usage
 
 
 
@@ -21,88 +26,107 @@ CACHE_TTL = 5000  # 30 minutes cache expiration
 # Load environment variables
 load_dotenv()
 
-# Set up OpenAI API Key
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-client = openai.OpenAI()
-
-
-
-def load_schema_embeddings():
-    with open('schema_embeddings.json', 'r') as f:
-        try:
-            schema_data = json.load(f)  # ✅ Ensure JSON is properly parsed
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Error decoding schema_embeddings.json: {str(e)}")
-
-    if not isinstance(schema_data, dict):
-        raise TypeError(f"Expected schema embeddings to be a dictionary, but got {type(schema_data)}. Check schema_embeddings.json content.")
-
-    return schema_data
-
-# ✅ Ensure it is loaded correctly
-schema_embeddings = load_schema_embeddings()
-assert isinstance(schema_embeddings, dict), f"schema_embeddings should be a dict, but got {type(schema_embeddings)}"
-print(f"schema_embeddings type: {type(schema_embeddings)}")
-print(f"schema_embeddings keys: {list(schema_embeddings.keys())[:5]}")  # Print first 5 keys to confirm structure
-
-
-
-
-def load_table_embeddings():
-    with open('table_embeddings.json', 'r') as f:
-        return json.load(f)
-table_embeddings = load_table_embeddings()
-
-def find_best_matching_table(user_input, table_embeddings):
-    input_embedding = client.embeddings.create(
-        input=user_input,
-        model="text-embedding-ada-002"
-    ).data[0].embedding
-
-    best_table, best_score = None, -1
-    for table, embedding in table_embeddings.items():
-        score = cosine_similarity([input_embedding], [embedding])[0][0]
-        if score > best_score:
-            best_table, best_score = table, score
-
+# The OpenAI client (and the openai package) is created on first use
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+                # Set up OpenAI API Key
+                _client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def set_client(client):
+    """Use ``client`` for chat and embedding calls (e.g. a stub in benchmarks)."""
+    global _client
+    _client = client
+    if hasattr(base_embedder, "_client"):
+        base_embedder._client = client
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+# "openai", or "hashing" for the offline stub; must match the provider the index was built with
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+# The OpenAI embedder builds its client lazily as well
+base_embedder = get_embedder(EMBEDDING_PROVIDER, model=EMBEDDING_MODEL) if EMBEDDING_PROVIDER == "openai" \
+    else get_embedder(EMBEDDING_PROVIDER)
+
+# Content-addressed (model, text) embedding cache: in-memory LRU over a SQLite file shared by workers
+embedding_cache = EmbeddingCache(
+    path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"),
+    max_memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000")),
+    max_disk_rows=int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000")),
+    disk_ttl=float(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 86400))),
+)
+embedder = CachedEmbedder(base_embedder, embedding_cache)
+
+# NL→SQL cache matched on question embeddings, persisted across restarts
+semantic_sql_cache = SemanticSQLCache(
+    path=os.getenv("SEMANTIC_CACHE_PATH", "semantic_sql_cache.npz"),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+)
+
+def embed_text(text):
+    """Embed a single string with the configured embedding model."""
+    return embedder.embed([text])[0]
+
+
+
+# Memory-mapped table and column embedding indexes (see embedding_index.py);
+# legacy *_embeddings.json files are converted on first load. Loaded on first
+# use or by load_indexes() during warm-up, never at import.
+_indexes = None
+_indexes_lock = threading.Lock()
+
+
+def load_indexes():
+    """Return ``(table_index, column_index)``, loading them on the first call."""
+    global _indexes
+    if _indexes is None:
+        with _indexes_lock:
+            if _indexes is None:
+                table_index = load_index("tables", legacy_json="table_embeddings.json")
+                column_index = load_index("columns", legacy_json="schema_embeddings.json")
+                logger.info(f"Embedding indexes loaded: {len(table_index)} tables, {len(column_index)} columns")
+                _indexes = table_index, column_index
+    return _indexes
+
+def find_best_matching_table(user_input, index=None):
+    index = load_indexes()[0] if index is None else index
+    if not len(index):
+        return None
+
+    input_embedding = embed_text(user_input)
+    (best_table, _), = index.top_k(input_embedding, k=1)
     return best_table
 
 column_match_cache = {}
 
-def find_best_column_match(user_input, schema_embeddings, table_name):
+def find_best_column_match(user_input, index, table_name):
     """
     Finds the best-matching column for a user-provided term using embeddings and exact matches.
     """
-    if not isinstance(schema_embeddings, dict):
-        raise TypeError(f"schema_embeddings must be a dictionary, got {type(schema_embeddings)}.")
-
-    if table_name not in schema_embeddings:
-        raise ValueError(f"Table '{table_name}' not found in schema embeddings. Available: {list(schema_embeddings.keys())}")
-
-    if not isinstance(schema_embeddings[table_name], dict):
-        raise TypeError(f"Expected schema_embeddings['{table_name}'] to be a dictionary, got {type(schema_embeddings[table_name])}")
+    index = load_indexes()[1] if index is None else index
 
-    valid_columns = list(schema_embeddings[table_name].keys())
+    if table_name not in index:
+        raise ValueError(f"Table '{table_name}' not found in column embeddings. Available: {list(index.groups)[:20]}")
 
-    # ✅ Check if exact match exists
-    for col in valid_columns:
-        if user_input.lower() == col.lower():
-            return col  # Exact match found ✅
+    # ✅ Check if exact match exists (hashed lowercase lookup)
+    exact = index.exact(user_input, group=table_name)
+    if exact is not None:
+        return exact  # Exact match found ✅
 
     # ✅ Compute embedding similarity only if no exact match
-    input_embedding = client.embeddings.create(
-        input=user_input,
-        model="text-embedding-ada-002"
-    ).data[0].embedding
+    input_embedding = embed_text(user_input)
 
-    best_column, best_score = None, -1
-    for column, embedding in schema_embeddings[table_name].items():
-        score = cosine_similarity([input_embedding], [embedding])[0][0]
-        if score > best_score:
-            best_column, best_score = column, score
-
-    return best_column  # Returns the best-matching column
+    matches = index.top_k(input_embedding, k=1, group=table_name)
+    return matches[0][0] if matches else None  # Returns the best-matching column
 
 
 
@@ -135,20 +159,51 @@ def find_best_column_match(user_input, schema_embeddings, table_name):
 
 
 
-def is_generic_message(user_input: str) -> bool:
+def _schema_vocabulary(connection_id=None):
+    # Only a schema already in memory: this runs on the event loop, where loading one
+    # (or retrying an unreachable database) would stall every request. Keyword scoring
+    # alone still decides greetings; SQL generation loads the schema on its worker thread.
+    service = schema_registry.loaded(connection_id)
+    if service is None:
+        return frozenset()
+    return local_classifier.vocabulary(service.tables, service.version)
+
+def classify_locally(user_input: str, connection_id=None):
+    """
+    Return "YES" (generic) or "NO" when the local classifier is confident
+    enough, None when the LLM has to decide. Makes no network calls.
+    """
+    label, confidence = local_classifier.classify(user_input, _schema_vocabulary(connection_id))
+    if confidence >= local_classifier.threshold:
+        local_classifier.record("local_generic" if label == "YES" else "local_analytic")
+        return label
+    return None
+
+def is_generic_message(user_input: str, connection_id=None) -> bool:
     """
     Uses OpenAI to determine if a message is generic (non-SQL related).
+
+    Obvious cases are decided by the local classifier; the LLM is only asked
+    when its confidence is below the configured threshold.
     """
-    client = openai.OpenAI() 
+    label = classify_locally(user_input, connection_id)
+    if label is not None:
+        return label
+    return classify_with_llm(user_input)
+
+def classify_with_llm(user_input: str):
+    """Ask gpt-4o-mini whether the message is generic ("YES") or analytic ("NO")."""
+    local_classifier.record("llm_fallback")
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
           model="gpt-4o-mini",
           messages=[{"role": "system", "content": "Identify whether the given message is a generic greeting or non-analytical message. Reply with 'YES' if it is generic, otherwise reply 'NO'. Strictly YES OR NO only allowed to display"},
                   {"role": "user", "content": user_input}],
           temperature=0
         )
 
+        record_llm_usage("gpt-4o-mini", response.usage, "classify")
         ai_reply = response.choices[0].message.content.strip().upper()
         return ai_reply
     
@@ -239,11 +294,42 @@ def is_generic_message(user_input: str) -> bool:
 #     return corrected_columns, column_mapping  # ✅ Return mapping to apply replacements
 
 
-@lru_cache(maxsize=100)
-def generate_sql_query(user_input):
+_full_schema_tokens = {}  # schema version -> token count of the unpruned schema
+
+def prune_schema_for_prompt(user_input, tables_metadata, version, question_embedding=None):
+    """Keep only the tables relevant to the question and log the prompt tokens saved."""
+    if version not in _full_schema_tokens:
+        _full_schema_tokens[version] = estimate_tokens(encode_schema(tables_metadata, version))
+    if not SCHEMA_PRUNING:
+        return tables_metadata
+
+    table_index, column_index = load_indexes()
+    pruned = prune_schema(user_input, tables_metadata, question_embedding, table_index, column_index)
+    logger.info(
+        f"Schema pruned to {len(pruned)}/{len(tables_metadata)} tables: "
+        f"~{_full_schema_tokens[version]} -> ~{estimate_tokens(encode_schema(pruned, version))} schema tokens"
+    )
+    return pruned
+
+def generate_sql_query(user_input, connection_id=None):
     
     """
     Convert natural language to SQL using OpenAI GPT.
+
+    Questions close enough to one answered before (by embedding similarity,
+    against the same schema version) reuse the stored SQL.
+    """
+    sql_query, commit = draft_sql_query(user_input, connection_id)
+    if commit is not None:
+        commit()
+    return sql_query
+
+def draft_sql_query(user_input, connection_id=None):
+    """
+    ``generate_sql_query`` without the semantic cache write: returns
+    ``(sql, commit)``, where ``commit()`` stores newly generated SQL (None on
+    a cache hit). Speculative generation commits only once the message is
+    confirmed to be a data question.
     """
     # cache_key = f"sql_query:{user_input}"
     # cached_sql = cache.get(cache_key)
@@ -251,8 +337,6 @@ def generate_sql_query(user_input):
     # if cached_sql:
     #     return cached_sql.decode('utf-8')  # 🔥 Return cached result immediately
 
-    client = openai.OpenAI()  # Create a client instance
-
     # best_table = find_best_matching_table(user_input, table_embeddings)
     # words = user_input.split()
     # best_columns = [find_best_column_match(word, schema_embeddings, best_table) for word in words]
@@ -268,57 +352,38 @@ def generate_sql_query(user_input):
     # print(f"[DEBUG] Processed SQL Input after Fix: {processed_input}")
 
     # Get table metadata dynamically
-    tables_metadata = get_table_metadata()
+    tables_metadata = get_table_metadata(connection_id)
+    version = get_schema_version(connection_id)
+    scope = connection_id or DEFAULT_CONNECTION_ID
+
+    cached_sql = semantic_sql_cache.lookup_exact(user_input, version, scope)
+    if cached_sql is not None:
+        return cached_sql, None
+
+    try:
+        question_embedding = embed_text(user_input)
+    except Exception as e:
+        logger.error(f"Question embedding failed, skipping semantic cache: {str(e)}")
+        question_embedding = None
+
+    if question_embedding is not None:
+        match = semantic_sql_cache.lookup(user_input, question_embedding, version, scope)
+        if match is not None:
+            cached_sql, similarity = match
+            logger.info(f"Semantic SQL cache hit (similarity {similarity:.3f})")
+            return cached_sql, None
+
+    if not uses_stable_prefix(tables_metadata, version, user_input):
+        # A pruned schema differs per question, so it is only sent when the full one does not fit
+        tables_metadata = prune_schema_for_prompt(user_input, tables_metadata, version, question_embedding)
     # schema_keywords = extract_keywords(tables_metadata)
     # schema_embeddings = get_schema_embeddings(tuple(schema_keywords), client) 
     # processed_user_input = preprocess_user_input(user_input, schema_keywords, schema_embeddings, client)
 
-    prompt_template = f"""
-    You're an expert SQL generator. Given the database schema below:
-
-    {tables_metadata}
-
-    Generate a precise and optimized SQL query for this natural language request:
-    "{user_input}"
-
-    Follow these critical instructions carefully:
-
-    1. **Schema Adherence**:
-      - Use only exact table and column names from the schema.
-      - Always enclose table and column names in backticks (`table_name`, `column_name`).
-
-    2. **Semantic Interpretation**:
-      - Detect and handle synonyms or related terms. For example:
-        - "Churn" → "Cancelled", "Active" → "On Track"/"Execution", etc.
-      - When uncertain, choose the closest logical equivalent available in the schema.
-
-    3. **Joins & Relationships**:
-      - Prioritize direct table columns; use JOIN only when columns are absent in the main table.
-      - When JOINs are required, dynamically infer them using matching or logically related column names (e.g., Customer ID).
-
-    3. **Aggregation and Filtering**:
-      - Clearly apply GROUP BY clauses if aggregations like COUNT, AVG, SUM, etc., are used.
-      - Always filter based on recent dates using `CreatedOn` if relevant, especially for usage or activity-related queries.
-
-    4. **Handling Ambiguity**:
-      - If multiple tables have similarly named columns, prefer the table whose overall context best matches the query intent.
-      - If ambiguity remains, pick the most frequently relevant table based on typical database use-cases.
-
-    5. **Query Optimization**:
-      - Return distinct and non-redundant rows.
-      - Always rank and filter recent records based on the `CreatedOn` column for usage or activity.
-
-    6. **Formatting and Values**:
-      - Use single quotes ('') for string literals (e.g., 'Active', 'On Track').
-      - Avoid unnecessary spaces or formatting artifacts.
-
-    7. **Output Requirements**:
-      - Support responses suitable for: tables, JSON objects, summaries, and visualizations (bar, pie, line charts).
-      - Ensure numeric values, percentages, or rankings are calculated accurately.
-
-    **Important**:  
-    Return **only** the finalized SQL query. **Do not** provide explanations, markdown formatting, or comments.
-    """
+    # Fixed instructions first, compact versioned schema next, question last (see prompt_builder.py)
+    messages, table_count = build_sql_messages(user_input, tables_metadata, version)
+    if table_count < len(tables_metadata):
+        logger.info(f"Prompt token budget kept {table_count}/{len(tables_metadata)} tables")
 
 
     # prompt_template = f"""
@@ -382,16 +447,19 @@ def generate_sql_query(user_input):
 
     
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-4o",
-        messages=[{"role": "system", "content": "You are an expert SQL assistant."},
-                {"role": "user", "content": prompt_template}],
+        messages=messages,
         temperature=0
     )
 
+    record_llm_usage("gpt-4o", response.usage, "generate_sql")
     sql_query = response.choices[0].message.content.strip()
     # Remove Markdown formatting if present
     sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
 
-    # cache.setex(cache_key, 3600, sql_query)
-    return sql_query
+    commit = None
+    if question_embedding is not None:
+        def commit():
+            semantic_sql_cache.add(user_input, question_embedding, sql_query, version, scope)
+    return sql_query, commit
@@ -0,0 +1,144 @@
+import os
+
+from schema_pruning import estimate_tokens
+
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "12000"))
+PROMPT_LAYOUT_VERSION = "v1"
+
+# "stable": whenever the full schema fits MAX_PROMPT_TOKENS it goes into the system message
+# after the instructions, so every question on a schema version shares a byte-identical
+# prefix the provider can cache (OpenAI needs >= 1024 tokens); schema pruning is only used
+# when it does not fit. "pruned": always send just the tables relevant to the question —
+# fewer input tokens, but the schema differs per question and the prefix cache never applies.
+PROMPT_SCHEMA_LAYOUT = os.getenv("PROMPT_SCHEMA_LAYOUT", "stable")
+
+# Fixed instructions, sent first and byte-identical on every request so the
+# provider can serve them from its prompt cache. Never interpolate into this.
+SQL_SYSTEM_PROMPT = """You're an expert SQL generator. You will be given a database schema and a natural language request.
+
+Schema format: one line per table, `table`: column, column, ...
+
+Follow these critical instructions carefully:
+
+1. **Schema Adherence**:
+  - Use only exact table and column names from the schema.
+  - Always enclose table and column names in backticks (`table_name`, `column_name`).
+
+2. **Semantic Interpretation**:
+  - Detect and handle synonyms or related terms. For example:
+    - "Churn" → "Cancelled", "Active" → "On Track"/"Execution", etc.
+  - When uncertain, choose the closest logical equivalent available in the schema.
+
+3. **Joins & Relationships**:
+  - Prioritize direct table columns; use JOIN only when columns are absent in the main table.
+  - When JOINs are required, dynamically infer them using matching or logically related column names (e.g., Customer ID).
+
+4. **Aggregation and Filtering**:
+  - Clearly apply GROUP BY clauses if aggregations like COUNT, AVG, SUM, etc., are used.
+  - Always filter based on recent dates using `CreatedOn` if relevant, especially for usage or activity-related queries.
+
+5. **Handling Ambiguity**:
+  - If multiple tables have similarly named columns, prefer the table whose overall context best matches the query intent.
+  - If ambiguity remains, pick the most frequently relevant table based on typical database use-cases.
+
+6. **Query Optimization**:
+  - Return distinct and non-redundant rows.
+  - Always rank and filter recent records based on the `CreatedOn` column for usage or activity.
+
+7. **Formatting and Values**:
+  - Use single quotes ('') for string literals (e.g., 'Active', 'On Track').
+  - Avoid unnecessary spaces or formatting artifacts.
+
+8. **Output Requirements**:
+  - Support responses suitable for: tables, JSON objects, summaries, and visualizations (bar, pie, line charts).
+  - Ensure numeric values, percentages, or rankings are calculated accurately.
+
+**Important**:
+Return **only** the finalized SQL query. **Do not** provide explanations, markdown formatting, or comments."""
+
+
+class PromptTooLargeError(ValueError):
+    pass
+
+
+def encode_table(table, columns):
+    return f"`{table}`: {', '.join(map(str, columns))}"
+
+
+def encode_schema(tables_metadata, version=None):
+    """Compact, deterministic schema text: a version header, then tables sorted by name."""
+    lines = [f"-- schema {version or 'unversioned'} ({PROMPT_LAYOUT_VERSION})"]
+    lines.extend(encode_table(t, tables_metadata[t]) for t in sorted(tables_metadata))
+    return "\n".join(lines)
+
+
+_schema_texts = {}  # schema version -> (encoded schema, token count)
+
+
+def schema_text(tables_metadata, version=None):
+    """``encode_schema`` output and its token count, memoized per schema version."""
+    cached = _schema_texts.get(version) if version else None
+    if cached is None:
+        text = encode_schema(tables_metadata, version)
+        cached = (text, estimate_tokens(text))
+        if version:
+            if len(_schema_texts) >= 32:
+                _schema_texts.pop(next(iter(_schema_texts)))
+            _schema_texts[version] = cached
+    return cached
+
+
+def _fixed_tokens(user_input):
+    return estimate_tokens(SQL_SYSTEM_PROMPT) + estimate_tokens(user_input) + 32
+
+
+def uses_stable_prefix(tables_metadata, version=None, user_input="", max_tokens=MAX_PROMPT_TOKENS,
+                       layout=PROMPT_SCHEMA_LAYOUT):
+    """True when the full schema goes into the cacheable prefix (so there is nothing to prune)."""
+    if layout != "stable" or not tables_metadata:
+        return False
+    return schema_text(tables_metadata, version)[1] + _fixed_tokens(user_input) <= max_tokens
+
+
+def fit_schema(tables_metadata, budget):
+    """
+    Drop tables from the end of ``tables_metadata`` (least relevant first when
+    it comes from the pruner) until the encoded schema fits in ``budget`` tokens.
+    """
+    costs = [(t, estimate_tokens(encode_table(t, cols)) + 1) for t, cols in tables_metadata.items()]
+    total = sum(c for _, c in costs)
+    kept = dict(tables_metadata)
+    while total > budget and kept:
+        table, cost = costs.pop()
+        del kept[table]
+        total -= cost
+    return kept
+
+
+def build_sql_messages(user_input, tables_metadata, version=None, max_tokens=MAX_PROMPT_TOKENS,
+                       layout=PROMPT_SCHEMA_LAYOUT):
+    """
+    Build the chat messages for SQL generation.
+
+    Layout, most stable first: fixed instructions, then the schema, then the
+    question last. With the stable layout the instructions and the full
+    schema form the system message, identical for every question on a schema
+    version; otherwise the (pruned) schema is sent alongside the question.
+    Raises ``PromptTooLargeError`` if not even one table fits the budget.
+    """
+    if uses_stable_prefix(tables_metadata, version, user_input, max_tokens, layout):
+        messages = [
+            {"role": "system", "content": f"{SQL_SYSTEM_PROMPT}\n\nDatabase schema:\n{schema_text(tables_metadata, version)[0]}"},
+            {"role": "user", "content": f"Request:\n{user_input}"},
+        ]
+        return messages, len(tables_metadata)
+
+    fitted = fit_schema(tables_metadata, max_tokens - _fixed_tokens(user_input))
+    if tables_metadata and not fitted:
+        raise PromptTooLargeError(f"Prompt exceeds MAX_PROMPT_TOKENS={max_tokens} even with a single table")
+
+    messages = [
+        {"role": "system", "content": SQL_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Database schema:\n{encode_schema(fitted, version)}\n\nRequest:\n{user_input}"},
+    ]
+    return messages, len(fitted)
@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+QUERY_GUARD = os.getenv("QUERY_GUARD", "true").lower() in ("1", "true", "yes")
+GUARD_MAX_EXAMINED_ROWS = int(os.getenv("GUARD_MAX_EXAMINED_ROWS", "100000000"))  # Reject above this estimate
+GUARD_MAX_FULL_SCAN_ROWS = int(os.getenv("GUARD_MAX_FULL_SCAN_ROWS", "50000000"))  # Reject full scans of bigger tables
+GUARD_AUTO_LIMIT = int(os.getenv("GUARD_AUTO_LIMIT", "10000"))  # Row cap for formats shown inline
+GUARD_TIMEOUT_MS = int(os.getenv("GUARD_TIMEOUT_MS", "30000"))  # Per-query execution time limit
+GUARD_HISTORY = int(os.getenv("GUARD_HISTORY", "500"))  # Estimate-vs-actual records kept
+
+# Formats that only ever show the first rows, so a LIMIT does not change what the user sees
+LIMITED_FORMATS = ("json", "table", "text")
+
+# "LIMIT count", "LIMIT count OFFSET skip" or MySQL's "LIMIT skip, count"
+_TRAILING_LIMIT_RE = re.compile(r"\blimit\s+(\d+)(?:\s*,\s*(\d+)|\s+offset\s+\d+)?\s*$", re.IGNORECASE)
+# Quoted strings and identifiers are skipped when looking for top-level keywords
+_TOKEN_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|\(|\)|\bselect\b", re.IGNORECASE)
+
+
+class QueryRejectedError(Exception):
+    pass
+
+
+def _statement(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def _main_select(sql: str):
+    """Offset of the top-level SELECT keyword (after any WITH clauses), or None."""
+    depth = 0
+    for match in _TOKEN_RE.finditer(sql):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.lower() == "select":
+            return match.start()
+    return None
+
+
+def dialect_name(dialect):
+    """``dialect.name``, except "mariadb" for MariaDB servers reached through the mysql dialect."""
+    return "mariadb" if getattr(dialect, "is_mariadb", False) else dialect.name
+
+
+def _cap_limit(statement, match, row_limit):
+    """``statement`` with its trailing LIMIT lowered to ``row_limit + 1`` rows, and the cap; unchanged when smaller."""
+    group = 2 if match.group(2) is not None else 1
+    if int(match.group(group)) <= row_limit:
+        return statement, None
+    start, end = match.span(group)
+    return f"{statement[:start]}{row_limit + 1}{statement[end:]}", row_limit
+
+
+class GuardedQuery:
+    """The SQL that will actually run, plus the row cap and timeout applied to it."""
+
+    def __init__(self, sql, original, limit=None, timeout_ms=None, dialect=None, statement=None):
+        self.sql = sql
+        self.original = original
+        self.limit = limit
+        self.timeout_ms = timeout_ms
+        self.dialect = dialect
+        self.statement = statement or sql  # The query without a SET STATEMENT wrapper, for EXPLAIN
+
+    def apply_timeout(self, db):
+        # MySQL/MariaDB carry the limit in the statement itself; PostgreSQL sets it for this transaction only
+        if self.timeout_ms and self.dialect == "postgresql":
+            db.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}"))
+
+
+class QueryGuard:
+    """
+    Cost checks that run before a generated query does.
+
+    ``prepare`` adds the timeout and, for inline formats, a LIMIT.
+    ``check`` runs EXPLAIN and rejects queries whose estimated examined rows
+    or full-table scans are above the thresholds. ``record`` keeps estimate
+    vs. actual numbers for each executed query.
+    """
+
+    def __init__(self, enabled=QUERY_GUARD, max_examined_rows=GUARD_MAX_EXAMINED_ROWS,
+                 max_full_scan_rows=GUARD_MAX_FULL_SCAN_ROWS, auto_limit=GUARD_AUTO_LIMIT,
+                 timeout_ms=GUARD_TIMEOUT_MS, history=GUARD_HISTORY):
+        self.enabled = enabled
+        self.max_examined_rows = max_examined_rows
+        self.max_full_scan_rows = max_full_scan_rows
+        self.auto_limit = auto_limit
+        self.timeout_ms = timeout_ms
+        self.records = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.limited = 0
+        self.unestimated = 0
+
+    def prepare(self, sql, response_format=None, dialect=None, row_limit=None):
+        """
+        Rewrite ``sql`` with the row cap and timeout; no database round trip.
+        ``row_limit`` overrides the automatic cap (e.g. a chart's point budget).
+        ``dialect`` is a ``dialect_name``, so MariaDB gets its own timeout syntax.
+        """
+        statement = _statement(sql)
+        if not self.enabled or ";" in statement:
+            return GuardedQuery(sql, sql, dialect=dialect)
+
+        limit = None
+        if row_limit is None and response_format in LIMITED_FORMATS:
+            row_limit = self.auto_limit
+        if row_limit:
+            # One extra row tells the caller that the result was cut
+            existing = _TRAILING_LIMIT_RE.search(statement)
+            if existing:
+                statement, limit = _cap_limit(statement, existing, row_limit)
+            else:
+                limit = row_limit
+                statement = f"{statement} LIMIT {limit + 1}"
+
+        timeout_ms = self.timeout_ms or None
+        if not timeout_ms:
+            return GuardedQuery(statement, sql, limit, timeout_ms, dialect)
+        if dialect == "mariadb":
+            # MariaDB ignores MAX_EXECUTION_TIME; max_statement_time is in seconds
+            wrapped = f"SET STATEMENT max_statement_time={timeout_ms / 1000:g} FOR {statement}"
+            return GuardedQuery(wrapped, sql, limit, timeout_ms, dialect, statement)
+        if dialect == "mysql" and "MAX_EXECUTION_TIME" not in statement.upper():
+            position = _main_select(statement)
+            if position is not None:
+                statement = f"{statement[:position + 6]} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{statement[position + 6:]}"
+        return GuardedQuery(statement, sql, limit, timeout_ms, dialect)
+
+    def estimate(self, db, guarded):
+        """EXPLAIN ``guarded.statement``; returns a dict of estimates, or None for dialects without support."""
+        if guarded.dialect in ("mysql", "mariadb"):
+            plan = [dict(row._mapping) for row in db.execute(text(f"EXPLAIN {guarded.statement}"))]
+            return _mysql_estimate(plan)
+        if guarded.dialect == "postgresql":
+            document = db.execute(text(f"EXPLAIN (FORMAT JSON) {guarded.statement}")).scalar()
+            if isinstance(document, str):
+                document = json.loads(document)
+            return _postgres_estimate(document[0]["Plan"])
+        return None
+
+    def check(self, db, guarded):
+        """Return the EXPLAIN estimate for ``guarded``, raising ``QueryRejectedError`` above the thresholds."""
+        if not self.enabled:
+            return None
+        try:
+            estimate = self.estimate(db, guarded)
+        except Exception as e:
+            # The query itself will report a syntax error; EXPLAIN failing is not a reason to block it
+            logger.info(f"EXPLAIN failed, running unguarded: {str(e)}")
+            db.rollback()
+            estimate = None
+        with self._lock:
+            self.checked += 1
+            if estimate is None:
+                self.unestimated += 1
+        if estimate is None:
+            return None
+
+        reason = None
+        if self.max_examined_rows and estimate["examined_rows"] > self.max_examined_rows:
+            reason = f"estimated {estimate['examined_rows']:,} rows examined (limit {self.max_examined_rows:,})"
+        elif self.max_full_scan_rows:
+            big_scans = [t for t, rows in estimate["full_scans"].items() if rows > self.max_full_scan_rows]
+            if big_scans:
+                reason = f"full scan of {', '.join(big_scans)} (over {self.max_full_scan_rows:,} rows)"
+        if reason:
+            with self._lock:
+                self.rejected += 1
+            logger.info(f"Query rejected by cost guard: {reason}")
+            raise QueryRejectedError(f"Query rejected by cost guard: {reason}. Try narrowing the question.")
+        return estimate
+
+    def record(self, guarded, estimate, actual_rows, elapsed_ms, truncated=False):
+        with self._lock:
+            if truncated:
+                self.limited += 1
+            self.records.append({
+                "sql": guarded.original[:200],
+                "dialect": guarded.dialect,
+                "estimated_rows": estimate["estimated_rows"] if estimate else None,
+                "examined_rows": estimate["examined_rows"] if estimate else None,
+                "actual_rows": actual_rows,
+                "elapsed_ms": round(elapsed_ms, 2),
+                "limit": guarded.limit,
+                "truncated": truncated,
+                "at": time.time(),
+            })
+
+    def stats(self):
+        with self._lock:
+            records = list(self.records)
+            counters = {"checked": self.checked, "rejected": self.rejected,
+                        "limited": self.limited, "unestimated": self.unestimated}
+        # How far off EXPLAIN was, as actual/estimated, over records that had an estimate
+        ratios = sorted(
+            r["actual_rows"] / r["estimated_rows"]
+            for r in records if r["estimated_rows"] and not r["truncated"]
+        )
+        return {
+            **counters,
+            "median_actual_to_estimate": ratios[len(ratios) // 2] if ratios else None,
+            "recent": records[-20:],
+        }
+
+
+def _mysql_estimate(plan):
+    """
+    Rows examined ~ product of per-table rows in the top-level nested loop,
+    plus the rows of subqueries; result rows additionally apply ``filtered``.
+    """
+    examined_loop, result_rows, examined_other = 1.0, 1.0, 0.0
+    full_scans = {}
+    for step in plan:
+        rows = float(step.get("rows") or 0)
+        filtered = float(step.get("filtered") or 100.0)
+        if str(step.get("type") or "").upper() == "ALL" and step.get("table"):
+            full_scans[step["table"]] = int(rows)
+        if step.get("id") in (1, None):
+            examined_loop *= max(rows, 1.0)
+            result_rows *= max(rows * filtered / 100.0, 1.0)
+        else:
+            examined_other += rows
+    return {
+        "estimated_rows": int(result_rows),
+        "examined_rows": int(examined_loop + examined_other),
+        "full_scans": full_scans,
+    }
+
+
+def _postgres_estimate(plan):
+    full_scans, examined = {}, 0.0
+
+    def walk(node):
+        nonlocal examined
+        if node.get("Node Type") == "Seq Scan":
+            full_scans[node.get("Relation Name", "?")] = int(node.get("Plan Rows", 0))
+        if "Relation Name" in node:
+            examined += float(node.get("Plan Rows", 0))
+        for child in node.get("Plans", ()):
+            walk(child)
+
+    walk(plan)
+    # Joins can produce more rows than they read; count whichever is larger
+    return {
+        "estimated_rows": int(plan.get("Plan Rows", 0)),
+        "examined_rows": int(max(examined, plan.get("Plan Rows", 0))),
+        "full_scans": full_scans,
+    }
+
+
+query_guard = QueryGuard()
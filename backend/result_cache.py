@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB per worker
+DEFAULT_TTL = 1800  # 30 minutes cache expiration
+SIZE_SAMPLE_ROWS = 64  # Rows measured before extrapolating the size of a result
+
+
+# Quoted literals/identifiers ('' and \' escapes included) are matched first so their whitespace is kept
+_SQL_TOKEN_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`|\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Collapse whitespace outside quotes and strip trailing semicolons so
+    equivalent SQL shares a cache entry; quoted text is left byte-for-byte.
+    """
+    sql = _SQL_TOKEN_RE.sub(lambda m: " " if m.group(0)[0].isspace() else m.group(0), sql).strip()
+    return sql.rstrip(";").strip()
+
+
+def make_cache_key(connection_id, sql: str) -> str:
+    """Build a cache key from the connection identity and the normalized SQL."""
+    digest = hashlib.sha256(normalize_sql(sql).encode("utf-8")).hexdigest()
+    return f"{connection_id or 'default'}:{digest}"
+
+
+def _value_size(value) -> int:
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(k) + _value_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_value_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def estimate_size(value) -> int:
+    """
+    Approximate the memory held by a cached query result.
+
+    Large row lists are measured on a sample and extrapolated, so sizing a
+    result stays cheap compared to fetching it.
+    """
+    if isinstance(value, dict) and isinstance(value.get("rows"), list):
+        rows = value["rows"]
+        base = sum(_value_size(v) for k, v in value.items() if k != "rows")
+        if len(rows) <= SIZE_SAMPLE_ROWS:
+            return base + _value_size(rows)
+        step = len(rows) // SIZE_SAMPLE_ROWS
+        sample = rows[::step][:SIZE_SAMPLE_ROWS]
+        per_row = sum(_value_size(r) for r in sample) / len(sample)
+        return base + sys.getsizeof(rows) + int(per_row * len(rows))
+    return _value_size(value)
+
+
+class ResultCache:
+    """
+    Byte-budgeted LRU cache with TTL expiry.
+
+    Entries are evicted least-recently-used first once the total size passes
+    ``max_bytes``; expired entries are dropped by a background sweeper thread.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, sweep_interval=60, sizeof=estimate_size):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            # A single result larger than the whole budget would flush everything else
+            logger.info(f"Result of {size} bytes exceeds cache budget, not caching")
+            return False
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def sweep(self):
+        """Drop all expired entries, returning how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info(f"Cache sweeper expired {removed} entries")
+            except Exception as e:
+                logger.error(f"Cache sweep failed: {str(e)}")
+
+    def start_sweeper(self):
+        if self._sweeper is None or not self._sweeper.is_alive():
+            self._stop.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="result-cache-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def cache_from_env(prefix="RESULT_CACHE", **kwargs):
+    """Create a ResultCache configured from ``<prefix>_MAX_BYTES`` / ``<prefix>_TTL`` environment variables."""
+    return ResultCache(
+        max_bytes=int(os.getenv(f"{prefix}_MAX_BYTES", kwargs.pop("max_bytes", DEFAULT_MAX_BYTES))),
+        ttl=float(os.getenv(f"{prefix}_TTL", kwargs.pop("ttl", DEFAULT_TTL))),
+        **kwargs,
+    )
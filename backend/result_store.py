@@ -0,0 +1,95 @@
+import base64
+import binascii
+import json
+import logging
+import os
+import secrets
+import time
+
+from result_cache import cache_from_env
+
+logger = logging.getLogger(__name__)
+
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "500"))
+RESULT_MAX_PAGE_SIZE = int(os.getenv("RESULT_MAX_PAGE_SIZE", "5000"))
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class StoredResult:
+    """An executed query kept as a typed DataFrame (one NumPy array per column)."""
+
+    def __init__(self, sql, frame, connection_id=None, truncated=False):
+        self.sql = sql
+        self.frame = frame
+        self.connection_id = connection_id
+        self.truncated = truncated
+        self.created_at = time.time()
+        self.nbytes = int(frame.memory_usage(index=False, deep=True).sum())
+
+    @property
+    def rowcount(self):
+        return len(self.frame)
+
+
+def encode_cursor(handle, offset):
+    payload = json.dumps({"h": handle, "o": offset}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(handle, cursor):
+    """Offset inside ``handle`` that ``cursor`` points at; cursors from other handles are rejected."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        offset = int(payload["o"])
+        if payload["h"] != handle or offset < 0:
+            raise ValueError
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeError):
+        raise InvalidCursorError("Invalid cursor")
+    return offset
+
+
+class ResultStore:
+    """
+    Materialized results addressed by opaque handles, so a result can be paged
+    through or re-rendered in another format without re-running the LLM or SQL.
+
+    Backed by a ResultCache: byte-budgeted (RESULT_STORE_MAX_BYTES) with TTL
+    expiry (RESULT_STORE_TTL).
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or cache_from_env(
+            "RESULT_STORE", max_bytes=128 * 1024 * 1024, ttl=900, sizeof=lambda r: r.nbytes
+        )
+
+    def put(self, sql, frame, connection_id=None, truncated=False):
+        handle = secrets.token_urlsafe(16)
+        stored = StoredResult(sql, frame, connection_id, truncated)
+        if not self.cache.set(handle, stored):
+            return None
+        logger.info(f"Stored result {handle}: {stored.rowcount} rows, {stored.nbytes} bytes")
+        return handle
+
+    def get(self, handle):
+        return self.cache.get(handle)
+
+    def page(self, handle, cursor=None, limit=RESULT_PAGE_SIZE):
+        """Return ``(stored, frame_slice, next_cursor)`` for one page; ``stored`` is None for unknown handles."""
+        stored = self.get(handle)
+        if stored is None:
+            return None, None, None
+        offset = decode_cursor(handle, cursor) if cursor else 0
+        limit = max(1, min(limit, RESULT_MAX_PAGE_SIZE))
+        end = offset + limit
+        next_cursor = encode_cursor(handle, end) if end < stored.rowcount else None
+        return stored, stored.frame.iloc[offset:end], next_cursor
+
+    def stats(self):
+        return self.cache.stats()
+
+
+result_store = ResultStore()
@@ -0,0 +1,127 @@
+import logging
+import os
+import re
+
+import numpy as np
+
+from intent_classifier import tokenize, STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PRUNING = os.getenv("SCHEMA_PRUNING", "true").lower() in ("1", "true", "yes")
+PRUNE_TOP_K = int(os.getenv("SCHEMA_PRUNE_TOP_K", "8"))  # Tables ranked into the prompt
+PRUNE_JOIN_TABLES = int(os.getenv("SCHEMA_PRUNE_JOIN_TABLES", "3"))  # Extra tables pulled in through shared keys
+
+# Weights of the three ranking signals
+TABLE_EMBEDDING_WEIGHT = 0.45
+COLUMN_EMBEDDING_WEIGHT = 0.35
+NAME_MATCH_WEIGHT = 0.2
+
+# "id", "customer_id", "Customer ID", "AccountID", "accountId" (but not "Paid")
+_KEY_RE = re.compile(r"^(id|ID|Id)$|[_\s](id|ID|Id)$|[a-z0-9](Id|ID)$")
+
+_encoding = None  # tiktoken encoding, loaded on first use (False when unavailable)
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of ``text`` (tiktoken when installed, otherwise ~4 characters per token)."""
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def is_key_column(column: str) -> bool:
+    return bool(_KEY_RE.search(column))
+
+
+def _name_scores(question, tables_metadata):
+    words = {t for t in tokenize(question) if len(t) > 2 and t not in STOPWORDS}
+    if not words:
+        return {}
+    scores = {}
+    for table, columns in tables_metadata.items():
+        score = 2.0 * len(words & set(tokenize(table)))
+        column_hits = sum(1 for c in columns if words & set(tokenize(str(c))))
+        score += min(column_hits, 5)
+        if score:
+            scores[table] = score
+    top = max(scores.values(), default=0)
+    return {t: s / top for t, s in scores.items()} if top else {}
+
+
+def _table_embedding_scores(question_embedding, table_index):
+    if question_embedding is None or table_index is None or not len(table_index) \
+            or table_index.dim != len(question_embedding):
+        return {}
+    scores = table_index.scores(question_embedding)
+    return dict(zip(table_index.names, scores.tolist()))
+
+
+def _column_embedding_scores(question_embedding, column_index):
+    """Best column similarity per table, from one matrix product over every column."""
+    if question_embedding is None or column_index is None or not len(column_index) \
+            or column_index.dim != len(question_embedding):
+        return {}
+    scores = column_index.scores(question_embedding)
+    groups = [(t, start) for t, (start, end) in column_index.groups.items() if end > start]
+    if not groups:
+        return {}
+    groups.sort(key=lambda g: g[1])
+    maxima = np.maximum.reduceat(scores, [start for _, start in groups])
+    return {t: float(m) for (t, _), m in zip(groups, maxima)}
+
+
+def rank_tables(question, tables_metadata, question_embedding=None, table_index=None, column_index=None):
+    """Score every table in ``tables_metadata`` against the question, best first."""
+    name = _name_scores(question, tables_metadata)
+    table_emb = _table_embedding_scores(question_embedding, table_index)
+    column_emb = _column_embedding_scores(question_embedding, column_index)
+    ranked = []
+    for table in tables_metadata:
+        score = (TABLE_EMBEDDING_WEIGHT * table_emb.get(table, 0.0)
+                 + COLUMN_EMBEDDING_WEIGHT * column_emb.get(table, 0.0)
+                 + NAME_MATCH_WEIGHT * name.get(table, 0.0))
+        ranked.append((table, score))
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked
+
+
+def prune_schema(question, tables_metadata, question_embedding=None, table_index=None, column_index=None,
+                 top_k=PRUNE_TOP_K, join_tables=PRUNE_JOIN_TABLES):
+    """
+    Return the subset of ``tables_metadata`` relevant to ``question``.
+
+    The top ``top_k`` tables by combined embedding/name score are kept, then
+    up to ``join_tables`` more tables that share a key column (``...ID``) with
+    them, so the model can still write the joins it needs.
+    """
+    if len(tables_metadata) <= top_k:
+        return tables_metadata
+
+    ranked = rank_tables(question, tables_metadata, question_embedding, table_index, column_index)
+    selected = [t for t, _ in ranked[:top_k]]
+
+    # A bare "id" is on every table and says nothing about how they join
+    keys = {str(c).lower() for t in selected for c in tables_metadata[t] if is_key_column(str(c)) and str(c).lower() != "id"}
+    added = 0
+    for table, _ in ranked[top_k:]:
+        if added >= join_tables:
+            break
+        if any(str(c).lower() in keys for c in tables_metadata[table]):
+            selected.append(table)
+            added += 1
+
+    # Most relevant first, so a later token budget trims from the least relevant end
+    return {t: tables_metadata[t] for t in selected}
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import bindparam, inspect, text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTION_ID = "default"
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "60"))  # seconds between DDL checks
+
+# One round trip for every column of every table in the current database
+MYSQL_COLUMNS_SQL = """
+    SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_KEY
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+MYSQL_STAMPS_SQL = """
+    SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE()
+"""
+POSTGRES_COLUMNS_SQL = """
+    SELECT table_name, column_name, data_type, NULL
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+    ORDER BY table_name, ordinal_position
+"""
+
+
+def schema_version(tables_metadata):
+    """Stable hash of the schema, used to invalidate anything derived from it."""
+    encoded = json.dumps(tables_metadata, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class SchemaService:
+    """
+    Cached schema for one connection.
+
+    ``tables`` (``{table: [column, ...]}``), ``column_types`` and ``version``
+    are plain attributes, so readers never touch the database. A background
+    thread polls ``information_schema.TABLES`` and re-reads columns only for
+    tables whose CREATE_TIME/UPDATE_TIME moved.
+    """
+
+    def __init__(self, engine, connection_id=DEFAULT_CONNECTION_ID, refresh_interval=SCHEMA_REFRESH_INTERVAL,
+                 is_released=None):
+        self.engine = engine
+        self.connection_id = connection_id
+        self.refresh_interval = refresh_interval
+        self.is_released = is_released or (lambda: False)  # True while the connection's pool is released
+        self.tables = {}
+        self.column_types = {}  # table -> {column: data type}
+        self.primary_keys = {}  # table -> [column, ...]
+        self.version = None
+        self.loaded_at = None
+        self._stamps = {}
+        self._lock = threading.RLock()
+        self._loaded = threading.Event()
+        self._stop = threading.Event()
+        self._refresher = None
+
+    @property
+    def dialect(self):
+        return self.engine.dialect.name
+
+    def _read_columns(self, conn, only_tables=None):
+        """Return ``{table: [(column, type, key), ...]}`` for all (or only the given) tables."""
+        if self.dialect in ("mysql", "mariadb"):
+            sql = MYSQL_COLUMNS_SQL
+        elif self.dialect == "postgresql":
+            sql = POSTGRES_COLUMNS_SQL
+        else:
+            # No bulk catalog query for this dialect; fall back to the inspector
+            inspector = inspect(conn)
+            names = only_tables or inspector.get_table_names()
+            result = {}
+            for table in names:
+                pk = set(inspector.get_pk_constraint(table).get("constrained_columns") or [])
+                result[table] = [(c["name"], str(c["type"]), "PRI" if c["name"] in pk else "")
+                                 for c in inspector.get_columns(table)]
+            return result
+
+        if only_tables:
+            if self.dialect == "postgresql":
+                statement = text(sql.replace("ORDER BY", "AND table_name = ANY(:tables) ORDER BY"))
+            else:
+                statement = text(sql.replace("ORDER BY", "AND TABLE_NAME IN :tables ORDER BY")).bindparams(
+                    bindparam("tables", expanding=True)
+                )
+            rows = conn.execute(statement, {"tables": list(only_tables)})
+        else:
+            rows = conn.execute(text(sql))
+
+        result = {table: [] for table in (only_tables or [])}
+        for table, column, data_type, key in rows:
+            result.setdefault(table, []).append((column, data_type, key or ""))
+        return result
+
+    def _read_stamps(self, conn):
+        if self.dialect not in ("mysql", "mariadb"):
+            return None
+        return {name: (str(created), str(updated)) for name, created, updated in conn.execute(text(MYSQL_STAMPS_SQL))}
+
+    def _apply(self, columns_by_table, removed=()):
+        tables = dict(self.tables)
+        column_types = dict(self.column_types)
+        primary_keys = dict(self.primary_keys)
+        for table in removed:
+            tables.pop(table, None)
+            column_types.pop(table, None)
+            primary_keys.pop(table, None)
+        for table, columns in columns_by_table.items():
+            tables[table] = [c for c, _, _ in columns]
+            column_types[table] = {c: t for c, t, _ in columns}
+            primary_keys[table] = [c for c, _, k in columns if k == "PRI"]
+        tables = dict(sorted(tables.items()))
+        version = schema_version(tables)
+        # Swap whole dicts so readers always see a consistent snapshot
+        self.tables, self.column_types, self.primary_keys = tables, column_types, primary_keys
+        if version != self.version:
+            logger.info(f"Schema for '{self.connection_id}' is now version {version} ({len(tables)} tables)")
+        self.version = version
+        self.loaded_at = time.time()
+
+    def load(self):
+        """Read the whole schema in one bulk query."""
+        start = time.perf_counter()
+        with self._lock:
+            with self.engine.connect() as conn:
+                stamps = self._read_stamps(conn)
+                columns = self._read_columns(conn)
+            self.tables, self.column_types, self.primary_keys = {}, {}, {}
+            self._apply(columns)
+            self._stamps = stamps or {}
+            self._loaded.set()
+        logger.info(f"Loaded schema for '{self.connection_id}' in {time.perf_counter() - start:.2f}s")
+        return self.tables
+
+    def refresh(self):
+        """Re-read columns for tables created, altered or dropped since the last check."""
+        if not self._loaded.is_set():
+            return self.load()
+        with self._lock:
+            with self.engine.connect() as conn:
+                stamps = self._read_stamps(conn)
+                if stamps is None:
+                    # No change timestamps for this dialect: the bulk query is a single round trip anyway
+                    self._apply(self._read_columns(conn), removed=list(self.tables))
+                    return self.tables
+                changed = [t for t, stamp in stamps.items() if self._stamps.get(t) != stamp]
+                removed = [t for t in self._stamps if t not in stamps]
+                if changed:
+                    self._apply(self._read_columns(conn, changed), removed)
+                elif removed:
+                    self._apply({}, removed)
+                self._stamps = stamps
+        if changed or removed:
+            logger.info(f"Schema refresh for '{self.connection_id}': {len(changed)} changed, {len(removed)} dropped")
+        return self.tables
+
+    @property
+    def is_loaded(self):
+        return self._loaded.is_set()
+
+    def ensure_loaded(self):
+        if not self._loaded.is_set():
+            # If the background thread is mid-load this waits for it instead of querying twice
+            with self._lock:
+                if not self._loaded.is_set():
+                    self.load()
+        return self
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            if self.is_released():
+                # Polling would reopen a pool released for idleness; refreshes resume once it is used again
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Schema refresh for '{self.connection_id}' failed: {str(e)}")
+
+    def start(self, background_load=True):
+        """Start the background refresher, optionally doing the initial load on it too."""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+
+        def run():
+            if background_load and not self._loaded.is_set():
+                try:
+                    self.load()
+                except Exception as e:
+                    logger.error(f"Initial schema load for '{self.connection_id}' failed: {str(e)}")
+            self._refresh_loop()
+
+        self._stop.clear()
+        self._refresher = threading.Thread(target=run, name=f"schema-{self.connection_id}", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class SchemaRegistry:
+    """Schema services keyed by connection ID."""
+
+    def __init__(self):
+        self._services = {}
+        self._lock = threading.Lock()
+        self.default_engine_factory = None  # Returns the engine for DEFAULT_CONNECTION_ID on first use
+        self.connection_released = None  # connection_id -> bool, set by the connection registry
+
+    def _released(self, connection_id):
+        check = self.connection_released
+        return check is not None and check(connection_id)
+
+    def register(self, connection_id, engine, start=True):
+        with self._lock:
+            service = self._services.get(connection_id)
+            if service is not None and service.engine is engine:
+                return service
+            if service is not None:
+                service.stop()
+            service = self._services[connection_id] = SchemaService(
+                engine, connection_id, is_released=lambda: self._released(connection_id)
+            )
+        if start:
+            service.start()
+        return service
+
+    def unregister(self, connection_id):
+        with self._lock:
+            service = self._services.pop(connection_id, None)
+        if service is not None:
+            service.stop()
+
+    def get(self, connection_id=None):
+        """Return the loaded schema service for ``connection_id`` (the default connection if None)."""
+        connection_id = connection_id or DEFAULT_CONNECTION_ID
+        service = self._services.get(connection_id)
+        if service is None:
+            if connection_id != DEFAULT_CONNECTION_ID or self.default_engine_factory is None:
+                raise KeyError(f"No schema registered for connection '{connection_id}'")
+            service = self.register(connection_id, self.default_engine_factory())
+        return service.ensure_loaded()
+
+    def loaded(self, connection_id=None):
+        """The schema service for ``connection_id`` if its schema is already in memory, else None (no I/O)."""
+        service = self._services.get(connection_id or DEFAULT_CONNECTION_ID)
+        if service is None or not service.is_loaded:
+            return None
+        return service
+
+    def stop_all(self):
+        with self._lock:
+            services = list(self._services.values())
+        for service in services:
+            service.stop()
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?.!").strip()
+
+
+# Numbers (5, 10.5, 2024-01-31) and quoted entities ('Acme', "West", “North”)
+_LITERAL_RE = re.compile(r"'([^']*)'|\"([^\"]*)\"|“([^”]*)”|(\d+(?:[.,:/-]\d+)*)")
+
+
+def question_literals(question: str) -> tuple:
+    """
+    The numbers and quoted entities of a question, in order. Questions that
+    differ only in these ("top 5" vs "top 10", 2023 vs 2024) embed almost
+    identically but need different SQL.
+    """
+    return tuple(next(g for g in m.groups() if g is not None).lower() for m in _LITERAL_RE.finditer(question))
+
+
+class _Scope:
+    """Cached questions for one schema: a row-normalized embedding matrix plus parallel lists."""
+
+    def __init__(self, schema_version, dim=0):
+        self.schema_version = schema_version
+        self._data = np.empty((0, dim), dtype=np.float32)  # Preallocated rows; the first len(self) are used
+        self.questions = []
+        self.literals = []
+        self.sql = []
+        self.exact = {}  # normalized question -> row
+
+    def __len__(self):
+        return len(self.questions)
+
+    @property
+    def matrix(self):
+        return self._data[:len(self)]
+
+    @property
+    def dim(self):
+        return self._data.shape[1]
+
+    def extend(self, questions, matrix, sql):
+        """Bulk-load rows (used when reading the cache file)."""
+        self._data = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.questions = list(questions)
+        self.sql = list(sql)
+        self.literals = [question_literals(q) for q in self.questions]
+        self.exact = {normalize_question(q): i for i, q in enumerate(self.questions)}
+
+    def add(self, question, embedding, sql):
+        if self.dim != embedding.shape[0]:
+            # Embedding model changed; old vectors are not comparable
+            self.__init__(self.schema_version, embedding.shape[0])
+        row = len(self)
+        if row == len(self._data):
+            # Grow geometrically so inserts are amortized O(dim), not a copy of the whole matrix
+            grown = np.empty((max(16, row * 2), self.dim), dtype=np.float32)
+            grown[:row] = self._data[:row]
+            self._data = grown
+        self._data[row] = embedding
+        self.questions.append(question)
+        self.literals.append(question_literals(question))
+        self.sql.append(sql)
+        self.exact[normalize_question(question)] = row
+
+    def drop_oldest(self, count):
+        keep = len(self) - count
+        self._data[:keep] = self._data[count:len(self)]
+        self.questions = self.questions[count:]
+        self.literals = self.literals[count:]
+        self.sql = self.sql[count:]
+        self.exact = {normalize_question(q): i for i, q in enumerate(self.questions)}
+
+
+class SemanticSQLCache:
+    """
+    Persistent NL→SQL cache that matches questions by embedding similarity.
+
+    Entries are grouped per scope (a connection); each scope remembers the
+    schema version its SQL was generated against and is emptied when that
+    version changes. Vectors are L2-normalized so a lookup is one matrix-vector
+    product against all cached questions.
+    """
+
+    def __init__(self, path=None, threshold=0.95, max_entries=5000, save_interval=30):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.literal_mismatches = 0  # Similar enough, but a number or quoted entity differed
+        self._loaded = not path  # The file is read on first use (or warm-up), not at construction
+
+    def ensure_loaded(self):
+        with self._lock:
+            self._load_once()
+
+    def _load_once(self):
+        if not self._loaded:
+            self._loaded = True
+            self.load()
+
+    def _scope(self, scope, schema_version):
+        self._load_once()
+        bucket = self._scopes.get(scope)
+        if bucket is None or bucket.schema_version != schema_version:
+            if bucket is not None and len(bucket):
+                logger.info(f"Schema changed for '{scope}', dropping {len(bucket)} cached SQL entries")
+                self.invalidations += 1
+                self._dirty = True
+            bucket = self._scopes[scope] = _Scope(schema_version)
+        return bucket
+
+    def lookup_exact(self, question, schema_version, scope="default"):
+        """Return cached SQL for a question seen verbatim (modulo case/whitespace), without embedding it."""
+        with self._lock:
+            bucket = self._scope(scope, schema_version)
+            row = bucket.exact.get(normalize_question(question))
+            if row is None:
+                return None
+            self.hits += 1
+            return bucket.sql[row]
+
+    def lookup(self, question, embedding, schema_version, scope="default"):
+        """
+        Return ``(sql, similarity)`` for the nearest cached question above the
+        threshold that has the same numbers and quoted entities, else None.
+        """
+        query = _normalize(embedding)
+        literals = question_literals(question)
+        with self._lock:
+            bucket = self._scope(scope, schema_version)
+            if not len(bucket) or bucket.dim != query.shape[0]:
+                self.misses += 1
+                return None
+            scores = bucket.matrix @ query
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for row in candidates[np.argsort(-scores[candidates])]:
+                if bucket.literals[row] == literals:
+                    self.hits += 1
+                    return bucket.sql[row], float(scores[row])
+            if len(candidates):
+                self.literal_mismatches += 1
+            self.misses += 1
+            return None
+
+    def add(self, question, embedding, sql, schema_version, scope="default"):
+        with self._lock:
+            bucket = self._scope(scope, schema_version)
+            bucket.add(question, _normalize(embedding), sql)
+            if len(bucket) > self.max_entries:
+                bucket.drop_oldest(max(1, self.max_entries // 10))
+            self._dirty = True
+        if time.monotonic() - self._last_save > self.save_interval:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+            self._dirty = True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(len(b) for b in self._scopes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "literal_mismatches": self.literal_mismatches,
+                "threshold": self.threshold,
+            }
+
+    def save(self):
+        """Write the cache to ``path`` atomically if anything changed since the last save."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            arrays = {}
+            meta = {}
+            for i, (scope, bucket) in enumerate(self._scopes.items()):
+                arrays[f"m{i}"] = bucket.matrix
+                meta[scope] = {"key": f"m{i}", "schema_version": bucket.schema_version,
+                               "questions": bucket.questions, "sql": bucket.sql}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to save semantic SQL cache: {str(e)}")
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                for scope, entry in meta.items():
+                    bucket = _Scope(entry["schema_version"])
+                    bucket.extend(entry["questions"], data[entry["key"]], entry["sql"])
+                    self._scopes[scope] = bucket
+            logger.info(f"Loaded semantic SQL cache with {sum(len(b) for b in self._scopes.values())} entries")
+        except Exception as e:
+            logger.error(f"Ignoring unreadable semantic SQL cache {self.path}: {str(e)}")
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Coalesce identical concurrent /query/ requests onto one computation
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time. Callers arriving while it
+    is in flight await the same task and all receive its result (or its
+    exception) instead of repeating the LLM calls and the query.
+
+    Keys are only shared within one event loop, i.e. per worker process.
+    Nothing is cached: the key is released as soon as the computation ends.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key, fn):
+        """Return ``(result, shared)``; ``shared`` is True when another caller's computation was reused."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            # A task of its own, so a leader whose client disconnects does not cancel it for the followers
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so a computation nobody awaits any more does not log "never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self):
+        calls = self.executions + self.coalesced
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._calls),
+            "coalesced_ratio": round(self.coalesced / calls, 4) if calls else 0.0,
+        }
+
+
+query_flights = SingleFlight()
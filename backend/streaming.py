@@ -0,0 +1,83 @@
+import datetime
+import decimal
+import json
+import logging
+import math
+import os
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "5000"))  # Rows fetched and sent per chunk
+
+
+def json_default(value):
+    """Serialize database types that the json module does not handle natively."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _clean(value):
+    # NaN / inf are not valid JSON; emit null like the table format does
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def iter_result_batches(engine, sql: str, batch_size: int = STREAM_BATCH_SIZE, with_description: bool = False,
+                        on_connect=None):
+    """
+    Execute ``sql`` on a server-side cursor and yield ``(columns, rows)`` batches
+    (``(columns, rows, cursor.description)`` with ``with_description``).
+
+    The connection is opened here rather than borrowed from the request session,
+    so it stays valid for as long as the response body is being streamed.
+    ``on_connect(conn)`` runs on it first (e.g. ``GuardedQuery.apply_timeout``).
+    """
+    with engine.connect() as conn:
+        if on_connect is not None:
+            on_connect(conn)
+        result = conn.execution_options(stream_results=True).execute(text(sql))
+        columns = list(result.keys())
+        description = result.cursor.description if result.cursor is not None else None
+        empty = True
+        for rows in result.partitions(batch_size):
+            empty = False
+            yield (columns, rows, description) if with_description else (columns, rows)
+        if empty:
+            # Still report the column names for results with no rows
+            yield (columns, [], description) if with_description else (columns, [])
+
+
+def stream_ndjson(engine, sql: str, batch_size: int = STREAM_BATCH_SIZE, on_connect=None):
+    """
+    Yield the result of ``sql`` as newline-delimited JSON, one object per row.
+
+    Each chunk holds at most ``batch_size`` rows, so memory stays flat however
+    many rows the query returns.
+    """
+    sent = 0
+    try:
+        for columns, rows in iter_result_batches(engine, sql, batch_size, on_connect=on_connect):
+            if not rows:
+                continue
+            lines = [
+                json.dumps(dict(zip(columns, map(_clean, row))), default=json_default)
+                for row in rows
+            ]
+            sent += len(lines)
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band as a final record
+        logger.error(f"Streaming query failed after {sent} rows: {str(e)}")
+        yield (json.dumps({"error": str(e), "rows_sent": sent}) + "\n").encode("utf-8")
+    else:
+        logger.info(f"Streamed {sent} rows as NDJSON")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are flat (imported as ``import result_cache``), as in app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
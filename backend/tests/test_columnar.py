@@ -0,0 +1,58 @@
+import decimal
+import io
+
+import pytest
+from sqlalchemy import create_engine, text
+
+pa = pytest.importorskip("pyarrow")
+
+import columnar  # noqa: E402
+from columnar import arrow_schema, stream_columnar  # noqa: E402
+
+columnar.load_pyarrow()
+
+
+def _read_stream(chunks):
+    return pa.ipc.open_stream(io.BytesIO(b"".join(chunks))).read_all()
+
+
+def test_later_batches_keep_fractions_and_validate(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (n NUMERIC, label TEXT)"))
+        conn.execute(text("INSERT INTO t VALUES (1, 'a'), (2, 'b'), (2.7, 'c'), (NULL, NULL), (4, 'e')"))
+
+    table = _read_stream(stream_columnar(engine, "SELECT n, label FROM t", "arrow", batch_size=2))
+    table.validate(full=True)
+    assert table.column("n").to_pylist() == [1.0, 2.0, 2.7, None, 4.0]
+    assert table.column("label").to_pylist() == ["a", "b", "c", None, "e"]
+
+
+def test_decimal_schema_comes_from_the_type_codes():
+    # pymysql-style description: DECIMAL(12, 2) is NEWDECIMAL (246) with its precision and scale
+    description = [("amount", 246, None, 12, 12, 2, True), ("id", 3, None, 11, 11, 0, False)]
+    first_batch = [(decimal.Decimal("12.50"), 1), (decimal.Decimal("3.25"), 2)]
+    later_batch = [(decimal.Decimal("1234567.89"), 3), (decimal.Decimal("0.10"), 4)]
+    schema = arrow_schema(["amount", "id"], description, "mysql", first_batch)
+
+    assert schema.field("amount").type == pa.decimal128(12, 2)
+    assert schema.field("id").type == pa.int64()
+    batches = [columnar._record_batch(["amount", "id"], rows, schema) for rows in (first_batch, later_batch)]
+    table = pa.Table.from_batches(batches)
+    table.validate(full=True)
+    assert table.column("amount").to_pylist()[2] == decimal.Decimal("1234567.89")
+
+
+def test_lossy_conversions_raise_instead_of_truncating():
+    description = [("id", 3, None, 11, 11, 0, False)]
+    schema = arrow_schema(["id"], description, "mysql", [(1,)])
+    with pytest.raises((pa.ArrowInvalid, pa.ArrowTypeError)):
+        columnar._record_batch(["id"], [(2.7,)], schema)
+
+
+def test_unconstrained_numeric_is_exported_as_exact_text():
+    description = [("ratio", 1700, None, None, None, None, True)]
+    schema = arrow_schema(["ratio"], description, "postgresql", [(decimal.Decimal("1.5"),)])
+    assert schema.field("ratio").type == pa.string()
+    batch = columnar._record_batch(["ratio"], [(decimal.Decimal("123456789.123456789"),)], schema)
+    assert batch.column(0).to_pylist() == ["123456789.123456789"]
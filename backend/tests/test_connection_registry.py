@@ -0,0 +1,77 @@
+import threading
+import time
+
+import connection_registry as registry_module
+from connection_registry import ConnectionRegistry
+from schema_service import SchemaRegistry
+
+
+def test_concurrent_connects_with_the_same_url_share_one_engine(tmp_path, monkeypatch):
+    created = []
+    real_create_engine = registry_module.create_engine
+
+    def slow_create_engine(url, **options):
+        time.sleep(0.02)
+        engine = real_create_engine(url, **options)
+        created.append(engine)
+        return engine
+
+    monkeypatch.setattr(registry_module, "create_engine", slow_create_engine)
+    registry = ConnectionRegistry()
+    url = f"sqlite:///{tmp_path / 'db.sqlite3'}"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.connect("a", url))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert {id(engine) for engine, _ in results} == {id(created[0])}
+    assert sum(1 for _, was_created in results if was_created) == 1
+    registry.dispose_all()
+
+
+def test_schema_refresher_skips_released_connections(tmp_path):
+    registry = ConnectionRegistry(idle_timeout=0)
+    schemas = SchemaRegistry()
+    schemas.connection_released = registry.is_released
+    engine, _ = registry.connect("a", f"sqlite:///{tmp_path / 'db.sqlite3'}")
+    service = schemas.register("a", engine, start=False)
+
+    registry.session("a").close()
+    assert not service.is_released()
+    assert registry.evict_idle() == 1
+    assert service.is_released()
+
+    refreshes = []
+    service.refresh = lambda: refreshes.append(1)
+    service.refresh_interval = 0.01
+    service.start(background_load=False)
+    time.sleep(0.1)
+    assert refreshes == []
+
+    # The next request reopens the pool and refreshes resume
+    registry.session("a").close()
+    assert not service.is_released()
+    time.sleep(0.1)
+    service.stop()
+    assert refreshes
+    registry.dispose_all()
+
+
+def test_open_sessions_keep_their_pool(tmp_path):
+    registry = ConnectionRegistry(idle_timeout=0)
+    registry.connect("a", f"sqlite:///{tmp_path / 'db.sqlite3'}")
+
+    db = registry.session("a")
+    time.sleep(0.01)
+    assert registry.evict_idle() == 0
+    assert registry.stats()["a"]["active_sessions"] == 1
+
+    db.close()
+    time.sleep(0.01)
+    assert registry.stats()["a"]["active_sessions"] == 0
+    assert registry.evict_idle() == 1
+    assert registry.is_released("a")
+    registry.dispose_all()
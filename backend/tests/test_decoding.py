@@ -0,0 +1,35 @@
+import datetime
+
+import pandas as pd
+
+from decoding import DATETIME, OBJECT, decode_frame
+
+
+def _frame(values):
+    return decode_frame({"columns": ["at"], "rows": [(v,) for v in values], "column_types": [DATETIME]})
+
+
+def test_mixed_utc_offsets_decode_to_utc():
+    plus_two = datetime.timezone(datetime.timedelta(hours=2))
+    values = [
+        datetime.datetime(2024, 3, 1, 12, 0, tzinfo=datetime.timezone.utc),
+        datetime.datetime(2024, 7, 1, 14, 0, tzinfo=plus_two),
+        None,
+    ]
+    df = _frame(values)
+    assert str(df["at"].dt.tz) == "UTC"
+    assert df["at"].iloc[0].hour == 12
+    assert df["at"].iloc[1].hour == 12  # 14:00+02:00
+    assert df["at"].isna().tolist() == [False, False, True]
+
+
+def test_naive_datetimes_stay_naive():
+    df = _frame([datetime.datetime(2024, 1, 1, 8), datetime.datetime(2024, 1, 2, 9)])
+    assert pd.api.types.is_datetime64_dtype(df["at"]) and df["at"].dt.tz is None
+
+
+def test_out_of_range_values_are_kept_not_coerced():
+    values = [datetime.datetime(1, 1, 1), datetime.datetime(2024, 1, 1)]
+    df = _frame(values)
+    assert df["at"].tolist() == values
+    assert decode_frame({"columns": ["a"], "rows": [(1,)], "column_types": [OBJECT]})["a"].tolist() == [1]
@@ -0,0 +1,123 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from decoding import OBJECT, column_kinds, decode_frame
+from downsampling import OTHER_LABEL, label_other_rows, pushdown_chart_reduction, reduce_for_chart
+
+MONTHS = ["2024-01", "2024-02", "2024-03", "2024-04", "2024-05", "2024-06", "2024-07", "2024-08"]
+VALUES = [10.0, 80.0, 30.0, 50.0, 5.0, 70.0, 20.0, 60.0]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sales (month TEXT, region_id INTEGER, amount REAL)"))
+        conn.execute(
+            text("INSERT INTO sales VALUES (:month, :region_id, :amount)"),
+            [{"month": m, "region_id": i + 1, "amount": v} for i, (m, v) in enumerate(zip(MONTHS, VALUES))],
+        )
+    with Session(engine) as session:
+        yield session
+
+
+def _run(db, sql):
+    result = db.execute(text(sql))
+    description = result.cursor.description
+    columns = list(result.keys())
+    rows = [tuple(r) for r in result]
+    query_result = {
+        "success": True, "rows": rows, "columns": columns,
+        "column_types": column_kinds(description, "sqlite", rows), "rowcount": len(rows),
+    }
+    return label_other_rows(query_result)
+
+
+def test_small_result_is_not_reduced():
+    df = pd.DataFrame({"month": MONTHS[:4], "amount": VALUES[:4]})
+    reduced, info = reduce_for_chart(df, "bar_chart", budget=5)
+    assert info is None
+    assert reduced["month"].tolist() == MONTHS[:4]
+    assert reduced["amount"].tolist() == VALUES[:4]
+
+
+@pytest.mark.parametrize("chart_type", ["bar_chart", "pie_chart"])
+def test_pushdown_matches_in_memory_reduction(db, chart_type):
+    sql = "SELECT month, amount FROM sales ORDER BY month"
+    pushed = _run(db, pushdown_chart_reduction(db, sql, chart_type, budget=5))
+
+    df = pd.DataFrame({"month": MONTHS, "amount": VALUES})
+    expected, _ = reduce_for_chart(df, chart_type, budget=5)
+    assert pushed["columns"] == ["month", "amount"]
+    assert [r[0] for r in pushed["rows"]] == expected["month"].tolist()
+    assert [r[1] for r in pushed["rows"]] == expected["amount"].tolist()
+
+
+def test_bar_pushdown_keeps_source_order_and_x_type(db):
+    sql = "SELECT region_id, amount FROM sales ORDER BY region_id"
+    pushed = _run(db, pushdown_chart_reduction(db, sql, "bar_chart", budget=4))
+    # Top 3 by amount (regions 2, 6, 8) in query order, then the rest summed
+    assert pushed["rows"] == [(2, 80.0), (6, 70.0), (8, 60.0), (OTHER_LABEL, 115.0)]
+    assert isinstance(pushed["rows"][0][0], int)
+
+
+def test_other_row_decodes_with_a_typed_x_column(db):
+    sql = "SELECT region_id, amount FROM sales"
+    query_result = _run(db, pushdown_chart_reduction(db, sql, "pie_chart", budget=3))
+    assert query_result["column_types"][0] == OBJECT
+    df = decode_frame(query_result)
+    assert df["region_id"].tolist() == [2, 6, OTHER_LABEL]
+
+
+def test_chart_query_within_budget_is_returned_unchanged(db):
+    pytest.importorskip("fastapi")
+    from app import execute_chart_query
+
+    sql = "SELECT month, amount FROM sales WHERE month <= '2024-04' ORDER BY month"
+    result = execute_chart_query(db, sql, "bar_chart")
+    assert result["success"]
+    assert result["rows"] == list(zip(MONTHS[:4], VALUES[:4]))
+
+
+def test_bar_pushdown_follows_the_inner_order_by(db):
+    sql = "SELECT region_id, amount FROM sales ORDER BY amount"
+    pushed = _run(db, pushdown_chart_reduction(db, sql, "bar_chart", budget=4))
+    assert pushed["rows"] == [(8, 60.0), (6, 70.0), (2, 80.0), (OTHER_LABEL, 115.0)]
+
+    sql = "SELECT s.region_id, s.amount FROM sales AS s ORDER BY 1 DESC LIMIT 100"
+    pushed = _run(db, pushdown_chart_reduction(db, sql, "bar_chart", budget=4))
+    assert pushed["rows"] == [(8, 60.0), (6, 70.0), (2, 80.0), (OTHER_LABEL, 115.0)]
+
+
+def test_bar_pushdown_without_order_by_ranks_by_value(db):
+    for sql in ("SELECT region_id, amount FROM sales", "SELECT region_id, amount FROM sales ORDER BY LENGTH(month)"):
+        pushed = _run(db, pushdown_chart_reduction(db, sql, "bar_chart", budget=4))
+        assert pushed["rows"] == [(2, 80.0), (6, 70.0), (8, 60.0), (OTHER_LABEL, 115.0)]
+
+
+def test_pushdown_skipped_without_window_functions(db, monkeypatch):
+    monkeypatch.setattr(db.get_bind().dialect, "server_version_info", (3, 24, 0))
+    sql = "SELECT month, amount FROM sales ORDER BY month"
+    assert pushdown_chart_reduction(db, sql, "bar_chart", budget=4) == sql
+
+
+def test_chart_query_over_budget_runs_only_the_pushdown(db, monkeypatch):
+    pytest.importorskip("fastapi")
+    import app
+
+    executed = []
+    original = app.safe_execute_query
+
+    def recording(db, sql, *args, **kwargs):
+        executed.append(sql)
+        return original(db, sql, *args, **kwargs)
+
+    monkeypatch.setattr(app, "safe_execute_query", recording)
+    monkeypatch.setattr(app, "chart_budget", lambda chart_type: 4)
+    sql = "SELECT region_id, amount FROM sales ORDER BY region_id"
+    result = app.execute_chart_query(db, sql, "bar_chart")
+
+    assert result["rows"] == [(2, 80.0), (6, 70.0), (8, 60.0), (OTHER_LABEL, 115.0)]
+    assert len(executed) == 2 and sql not in executed  # The count probe, then the reduced query
@@ -0,0 +1,60 @@
+import sqlite3
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, embedding_key
+
+
+def test_sqlite_file_is_created_on_first_use_not_construction(tmp_path):
+    path = tmp_path / "embedding_cache.sqlite3"
+    cache = EmbeddingCache(path=str(path))
+    assert not path.exists()
+
+    assert cache.get_many("model", ["hello"]) == [None]
+    assert path.exists()
+
+
+def test_vectors_round_trip_through_the_file(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite3")
+    EmbeddingCache(path=path).put_many("model", ["hello"], [np.ones(4)])
+
+    fresh = EmbeddingCache(path=path)
+    vector = fresh.get_many("model", ["hello"])[0]
+    assert vector.tolist() == [1.0, 1.0, 1.0, 1.0]
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_keeps_the_most_recently_used_rows(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite3")
+    cache = EmbeddingCache(path=path, max_memory_entries=0, max_disk_rows=2)
+    cache.put_many("model", ["a"], [np.ones(2)])
+    cache.put_many("model", ["b"], [np.ones(2)])
+    assert cache.get_many("model", ["a"])[0] is not None  # "a" is now more recent than "b"
+
+    cache.put_many("model", ["c"], [np.ones(2)])
+    fresh = EmbeddingCache(path=path, max_memory_entries=0)
+    assert [v is not None for v in fresh.get_many("model", ["a", "b", "c"])] == [True, False, True]
+    assert cache.stats()["disk_evictions"] == 1
+
+
+def test_disk_tier_drops_expired_rows(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite3")
+    EmbeddingCache(path=path).put_many("model", ["old"], [np.ones(2)])
+
+    cache = EmbeddingCache(path=path, max_memory_entries=0, disk_ttl=1e-9)
+    cache.put_many("model", ["new"], [np.ones(2)])
+    assert cache.get_many("model", ["old"]) == [None]
+
+
+def test_files_without_last_used_are_upgraded(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)")
+    conn.execute("INSERT INTO embeddings VALUES (?, ?, ?, ?)",
+                 (embedding_key("model", "hello"), "model", np.ones(2, dtype=np.float32).tobytes(), 1.0))
+    conn.commit()
+    conn.close()
+
+    cache = EmbeddingCache(path=path)
+    assert cache.get_many("model", ["hello"])[0].tolist() == [1.0, 1.0]
+    cache.put_many("model", ["world"], [np.ones(2)])
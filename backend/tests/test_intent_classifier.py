@@ -0,0 +1,26 @@
+import pytest
+
+from intent_classifier import LocalIntentClassifier, schema_vocabulary
+
+classifier = LocalIntentClassifier(threshold=0.8)
+VOCABULARY = schema_vocabulary({"orders": ["order_id", "amount", "created_at"], "customers": ["customer_id", "region"]})
+
+
+@pytest.mark.parametrize("message", [
+    "hi", "Hello there!", "thanks", "how are you", "How are you doing?", "how can you help me",
+    "what can you do", "who are you", "what's your name",
+])
+def test_greetings_are_generic_with_high_confidence(message):
+    label, confidence = classifier.classify(message, VOCABULARY)
+    assert label == "YES"
+    assert confidence >= classifier.threshold
+
+
+@pytest.mark.parametrize("message", [
+    "how many orders were placed last month",
+    "hi, show revenue by region",
+    "total amount per customer",
+])
+def test_analytic_questions_are_not_generic(message):
+    label, _ = classifier.classify(message, VOCABULARY)
+    assert label == "NO"
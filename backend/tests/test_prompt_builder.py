@@ -0,0 +1,46 @@
+import pytest
+
+from prompt_builder import PromptTooLargeError, build_sql_messages
+from schema_service import schema_version
+
+SCHEMA = {
+    f"table_{i:02d}": [f"column_{j}" for j in range(12)] + ["Customer ID", "CreatedOn"]
+    for i in range(40)
+}
+VERSION = schema_version(SCHEMA)
+
+
+def _prefix(messages):
+    return messages[:-1]
+
+
+def test_prefix_is_stable_across_questions():
+    first, _ = build_sql_messages("total revenue by month", SCHEMA, VERSION)
+    second, _ = build_sql_messages("top 10 customers by number of orders in 2024", SCHEMA, VERSION)
+    assert _prefix(first) == _prefix(second)
+    assert first[-1]["content"].endswith("total revenue by month")
+    # The whole schema is in the shared prefix; the last message carries only the question
+    assert "`table_39`" in first[0]["content"]
+    assert "Database schema" not in second[-1]["content"]
+
+
+def test_prefix_is_stable_whatever_the_dict_order():
+    reordered = dict(reversed(list(SCHEMA.items())))
+    assert _prefix(build_sql_messages("q", SCHEMA, VERSION)[0]) == _prefix(build_sql_messages("q", reordered, VERSION)[0])
+
+
+def test_pruned_layout_when_the_schema_does_not_fit():
+    messages, table_count = build_sql_messages("total revenue", SCHEMA, VERSION, max_tokens=1500)
+    assert 0 < table_count < len(SCHEMA)
+    assert "Database schema" in messages[-1]["content"]
+
+
+def test_pruned_layout_on_request():
+    messages, table_count = build_sql_messages("total revenue", SCHEMA, VERSION, layout="pruned")
+    assert table_count == len(SCHEMA)
+    assert messages[-1]["content"].startswith("Database schema")
+
+
+def test_prompt_too_large():
+    with pytest.raises(PromptTooLargeError):
+        build_sql_messages("total revenue", SCHEMA, VERSION, max_tokens=100)
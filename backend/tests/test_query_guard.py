@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import create_engine
+
+from query_guard import QueryGuard, QueryRejectedError, dialect_name
+
+
+class RecordingDb:
+    """Stands in for a session: records statements and answers EXPLAIN with a fixed plan."""
+
+    def __init__(self, plan=()):
+        self.plan = list(plan)
+        self.executed = []
+
+    def execute(self, statement):
+        self.executed.append(str(statement))
+        return [_Row(step) for step in self.plan]
+
+    def rollback(self):
+        pass
+
+
+class _Row:
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+
+def _guard(**kwargs):
+    return QueryGuard(enabled=True, **{"auto_limit": 100, "timeout_ms": 5000, **kwargs})
+
+
+def test_limit_appended_for_inline_formats_only():
+    guard = _guard(timeout_ms=0)
+    guarded = guard.prepare("SELECT a FROM t;", "json", "postgresql")
+    assert guarded.sql == "SELECT a FROM t LIMIT 101"
+    assert guarded.limit == 100
+    assert guard.prepare("SELECT a FROM t", "bar_chart", "postgresql").sql == "SELECT a FROM t"
+    assert guard.prepare("SELECT a FROM t", "json", "postgresql", row_limit=5).sql == "SELECT a FROM t LIMIT 6"
+
+
+@pytest.mark.parametrize("sql, expected, limit", [
+    ("SELECT a FROM t LIMIT 10", "SELECT a FROM t LIMIT 10", None),
+    ("SELECT a FROM t LIMIT 5000", "SELECT a FROM t LIMIT 101", 100),
+    ("SELECT a FROM t LIMIT 5000 OFFSET 20", "SELECT a FROM t LIMIT 101 OFFSET 20", 100),
+    ("SELECT a FROM t LIMIT 20, 5000", "SELECT a FROM t LIMIT 20, 101", 100),
+    ("SELECT a FROM (SELECT a FROM t LIMIT 5000) AS s", "SELECT a FROM (SELECT a FROM t LIMIT 5000) AS s LIMIT 101", 100),
+])
+def test_existing_limit_is_capped(sql, expected, limit):
+    guarded = _guard(timeout_ms=0).prepare(sql, "table", "mysql")
+    assert guarded.sql == expected
+    assert guarded.limit == limit
+
+
+def test_mysql_timeout_hint_goes_after_the_main_select():
+    guarded = _guard().prepare("WITH c AS (SELECT a FROM t) SELECT a FROM c", None, "mysql")
+    assert guarded.sql == "WITH c AS (SELECT a FROM t) SELECT /*+ MAX_EXECUTION_TIME(5000) */ a FROM c"
+    db = RecordingDb()
+    guarded.apply_timeout(db)
+    assert db.executed == []
+
+
+def test_mariadb_uses_set_statement_and_explains_the_bare_query():
+    guard = _guard()
+    guarded = guard.prepare("SELECT a FROM t", "json", "mariadb")
+    assert guarded.sql == "SET STATEMENT max_statement_time=5 FOR SELECT a FROM t LIMIT 101"
+    assert "MAX_EXECUTION_TIME" not in guarded.sql
+
+    db = RecordingDb([{"id": 1, "table": "t", "type": "ALL", "rows": 10, "filtered": 100.0}])
+    guard.check(db, guarded)
+    assert db.executed == ["EXPLAIN SELECT a FROM t LIMIT 101"]
+
+
+def test_postgres_sets_a_local_statement_timeout():
+    guarded = _guard().prepare("SELECT a FROM t", None, "postgresql")
+    assert guarded.sql == "SELECT a FROM t"
+    db = RecordingDb()
+    guarded.apply_timeout(db)
+    assert db.executed == ["SET LOCAL statement_timeout = 5000"]
+
+
+def test_check_rejects_big_full_scans():
+    guard = _guard(max_full_scan_rows=1000)
+    db = RecordingDb([{"id": 1, "table": "events", "type": "ALL", "rows": 50000, "filtered": 100.0}])
+    with pytest.raises(QueryRejectedError):
+        guard.check(db, guard.prepare("SELECT * FROM events", None, "mysql"))
+
+
+def test_dialect_name_tells_mariadb_apart():
+    dialect = create_engine("sqlite://").dialect
+    assert dialect_name(dialect) == "sqlite"
+    dialect.is_mariadb = True
+    assert dialect_name(dialect) == "mariadb"
+
+
+def test_streamed_queries_are_guarded_without_a_row_cap():
+    pytest.importorskip("fastapi")
+    from sqlalchemy.orm import Session
+
+    from app import guard_stream_query
+    from streaming import stream_ndjson
+
+    engine = create_engine("sqlite://")
+    with Session(engine) as db:
+        guarded = guard_stream_query(db, "SELECT 1 AS n UNION ALL SELECT 2")
+    assert guarded.sql == "SELECT 1 AS n UNION ALL SELECT 2"
+    assert guarded.limit is None
+
+    connections = []
+    body = b"".join(stream_ndjson(engine, guarded.sql, on_connect=connections.append))
+    assert body == b'{"n": 1}\n{"n": 2}\n'
+    assert len(connections) == 1
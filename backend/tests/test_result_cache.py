@@ -0,0 +1,20 @@
+from result_cache import make_cache_key, normalize_sql
+
+
+def test_whitespace_outside_quotes_is_collapsed():
+    assert normalize_sql("SELECT  *\n  FROM t ;") == "SELECT * FROM t"
+    assert make_cache_key("c", "SELECT  *  FROM t;") == make_cache_key("c", "SELECT * FROM t")
+
+
+def test_literals_differing_in_whitespace_get_distinct_keys():
+    assert make_cache_key("c", "SELECT * FROM t WHERE n = 'a  b'") != make_cache_key("c", "SELECT * FROM t WHERE n = 'a b'")
+    assert make_cache_key("c", 'SELECT "a  b" FROM t') != make_cache_key("c", 'SELECT "a b" FROM t')
+
+
+def test_escaped_quotes_keep_literal_whitespace():
+    assert normalize_sql("SELECT 'it''s   here'  FROM t") == "SELECT 'it''s   here' FROM t"
+    assert normalize_sql("SELECT 'a\\'  b'  FROM t") == "SELECT 'a\\'  b' FROM t"
+
+
+def test_connection_is_part_of_the_key():
+    assert make_cache_key("a", "SELECT 1") != make_cache_key("b", "SELECT 1")
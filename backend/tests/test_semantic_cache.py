@@ -0,0 +1,59 @@
+import numpy as np
+
+from semantic_cache import SemanticSQLCache, question_literals
+
+
+def _vector(seed, dim=8):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def test_question_literals():
+    assert question_literals("Top 5 customers in 2023") == ("5", "2023")
+    assert question_literals("orders from 'Acme Corp' since 2024-01-31") == ("acme corp", "2024-01-31")
+    assert question_literals("revenue by region") == ()
+
+
+def test_semantic_hit_requires_identical_numbers_and_entities():
+    cache = SemanticSQLCache()
+    embedding = _vector(0)
+    cache.add("top 5 customers by revenue", embedding, "SELECT ... LIMIT 5", "v1")
+
+    # Near-identical embedding (as for "top 10 ..."), but a different number: not a hit
+    assert cache.lookup("top 10 customers by revenue", embedding, "v1") is None
+    assert cache.stats()["literal_mismatches"] == 1
+
+    sql, similarity = cache.lookup("show the top 5 customers by revenue", embedding, "v1")
+    assert sql == "SELECT ... LIMIT 5"
+    assert similarity > 0.99
+
+
+def test_lookup_skips_to_a_candidate_with_matching_literals():
+    cache = SemanticSQLCache(threshold=0.9)
+    embedding = _vector(1)
+    cache.add("sales in 2023", embedding, "SELECT 2023", "v1")
+    cache.add("sales in 2024", embedding * 1.01, "SELECT 2024", "v1")
+    assert cache.lookup("sales in 2024", embedding, "v1")[0] == "SELECT 2024"
+    assert cache.lookup("sales in 2025", embedding, "v1") is None
+
+
+def test_growth_and_eviction_keep_rows_aligned():
+    cache = SemanticSQLCache(max_entries=50)
+    for i in range(120):
+        cache.add(f"question {i}", _vector(i), f"SELECT {i}", "v1")
+    bucket = cache._scopes["default"]
+    assert len(bucket) <= 50
+    assert bucket.matrix.shape == (len(bucket), 8)
+    last = len(bucket) - 1
+    assert bucket.sql[last] == "SELECT 119"
+    assert cache.lookup("question 119", _vector(119), "v1")[0] == "SELECT 119"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "cache.npz")
+    cache = SemanticSQLCache(path=path)
+    cache.add("top 3 products", _vector(2), "SELECT 3", "v1")
+    cache.save()
+
+    restored = SemanticSQLCache(path=path)
+    assert restored.lookup("top 3 products", _vector(2), "v1")[0] == "SELECT 3"
+    assert restored.lookup("top 4 products", _vector(2), "v1") is None
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def speculation(monkeypatch):
+    commits = []
+
+    def draft(user_input, connection_id=None):
+        time.sleep(0.05)  # Still running when the classifier answers
+        return "SELECT 1", lambda: commits.append(user_input)
+
+    monkeypatch.setattr(app, "SPECULATIVE_SQL", True)
+    monkeypatch.setattr(app, "classify_locally", lambda user_input, connection_id=None: None)
+    monkeypatch.setattr(app, "draft_sql_query", draft)
+    return commits
+
+
+def test_generic_verdict_never_caches_the_speculative_sql(monkeypatch, speculation):
+    monkeypatch.setattr(app, "classify_with_llm", lambda user_input: "YES")
+
+    async def run():
+        result = await app.classify_and_generate("nice weather today, isn't it")
+        await asyncio.sleep(0.1)  # Let the abandoned draft finish
+        return result
+
+    assert asyncio.run(run()) is None
+    assert speculation == []
+
+
+def test_confirmed_question_caches_the_draft(monkeypatch, speculation):
+    monkeypatch.setattr(app, "classify_with_llm", lambda user_input: "NO")
+    assert asyncio.run(app.classify_and_generate("orders last week")) == "SELECT 1"
+    assert speculation == ["orders last week"]
+
+
+def test_local_classifier_does_no_schema_io_on_a_cold_schema(monkeypatch):
+    import llama_sql_agent
+    from schema_service import schema_registry
+
+    def unreachable(*args, **kwargs):
+        raise AssertionError("schema loaded on the event loop")
+
+    monkeypatch.setattr(schema_registry, "get", unreachable)
+    monkeypatch.setattr(schema_registry, "loaded", lambda connection_id=None: None)
+    assert llama_sql_agent.classify_locally("hi") == "YES"
@@ -0,0 +1,88 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from decoding import column_kinds, decode_frame
+from streaming import iter_result_batches, STREAM_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+TEXT_MAX_ROWS = int(os.getenv("TEXT_MAX_ROWS", "10000"))  # Rows rendered into an inline text response
+TEXT_MAX_CHARS = int(os.getenv("TEXT_MAX_CHARS", str(1024 * 1024)))  # Characters in an inline text response
+
+
+def _row_template(columns) -> str:
+    # "col: {}, col2: {}" -- one str.format call per row fills every column at once
+    return ", ".join(f"{str(col).replace('{', '{{').replace('}', '}}')}: {{}}" for col in columns)
+
+
+def format_lines(df: pd.DataFrame) -> list:
+    """One "col: value, col2: value" line per row, built column-wise instead of with ``iterrows``."""
+    if df.empty:
+        return []
+    template = _row_template(df.columns)
+    # Positional access keeps duplicate column names (e.g. two ``id`` from a join) apart
+    columns = [df.iloc[:, i].tolist() for i in range(df.shape[1])]
+    return list(map(template.format, *columns))
+
+
+def _cap_chars(lines, max_chars):
+    """Number of leading lines that fit in ``max_chars`` once joined with newlines."""
+    if not lines:
+        return 0
+    ends = np.cumsum(np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)) + 1) - 1
+    return int(np.searchsorted(ends, max_chars, side="right"))
+
+
+def format_text(df: pd.DataFrame, max_rows=TEXT_MAX_ROWS, max_chars=TEXT_MAX_CHARS):
+    """
+    Render ``df`` for the ``text`` format.
+
+    Returns the text and, when a cap cut the output short, a dict with the
+    number of rows shown and the total.
+    """
+    # A single value reads as "col": value
+    if df.shape == (1, 1):
+        return f'"{df.columns[0]}": {df.iloc[0, 0]}', None
+
+    total = len(df)
+    lines = format_lines(df.iloc[:max_rows] if max_rows else df)
+    shown = _cap_chars(lines, max_chars) if max_chars else len(lines)
+    if shown == total:
+        return "\n".join(lines), None
+
+    text_data = "\n".join(lines[:shown])
+    text_data += f"\n... {total - shown} more rows"
+    logger.info(f"Text output truncated to {shown} of {total} rows")
+    return text_data, {"rows_shown": shown, "total_rows": total}
+
+
+def stream_text(engine, sql: str, batch_size: int = STREAM_BATCH_SIZE, max_rows=None, on_connect=None):
+    """
+    Yield the result of ``sql`` as text lines, one server-side batch at a time.
+
+    Same line layout as ``format_text``; ``max_rows`` optionally stops the
+    stream early. Errors after the first chunk are reported in-band.
+    """
+    sent = 0
+    try:
+        for columns, rows in iter_result_batches(engine, sql, batch_size, on_connect=on_connect):
+            if not rows:
+                continue
+            if max_rows is not None:
+                rows = rows[:max_rows - sent]
+            kinds = column_kinds([(c, None) for c in columns], None, rows)
+            df = decode_frame({"rows": rows, "columns": columns, "column_types": kinds})
+            lines = format_lines(df)
+            sent += len(lines)
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            if max_rows is not None and sent >= max_rows:
+                yield f"... stopped at the {max_rows}-row limit\n".encode("utf-8")
+                break
+    except Exception as e:
+        logger.error(f"Text streaming failed after {sent} rows: {str(e)}")
+        yield f"ERROR: {str(e)}\n".encode("utf-8")
+    else:
+        logger.info(f"Streamed {sent} rows as text")
@@ -0,0 +1,69 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# "background": serve immediately and warm up on a thread; "blocking": finish warm-up
+# before accepting requests; "off": everything initializes lazily on first use
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
+WARMUP_MODES = ("background", "blocking", "off")
+
+
+class Readiness:
+    """Runs the warm-up steps once and reports their progress for the readiness probe."""
+
+    def __init__(self):
+        self.mode = None
+        self.steps = {}  # name -> {"status": "pending" | "ok" | "error", "ms": ..., "error": ...}
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def run(self, steps):
+        """Run ``steps`` (``(name, callable)`` pairs) in order; a failing step does not stop the rest."""
+        self.started_at = time.time()
+        self.steps = {name: {"status": "pending"} for name, _ in steps}
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+                self.steps[name] = {"status": "ok"}
+            except Exception as e:
+                logger.error(f"Warm-up step '{name}' failed: {str(e)}")
+                self.steps[name] = {"status": "error", "error": str(e)}
+            self.steps[name]["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        self.finished_at = time.time()
+        self._done.set()
+        logger.info(f"Warm-up finished in {self.finished_at - self.started_at:.2f}s: {self.steps}")
+
+    def start(self, steps, mode=WARMUP_MODE):
+        """Start warm-up; only ``blocking`` mode waits for it (call it from a worker thread then)."""
+        if mode not in WARMUP_MODES:
+            raise ValueError(f"Invalid WARMUP_MODE '{mode}', expected one of {WARMUP_MODES}")
+        self.mode = mode
+        if mode == "off":
+            self._done.set()
+        elif mode == "blocking":
+            self.run(steps)
+        else:
+            self._thread = threading.Thread(target=self.run, args=(steps,), name="warm-up", daemon=True)
+            self._thread.start()
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "mode": self.mode,
+            "healthy": all(s["status"] == "ok" for s in self.steps.values()),
+            "steps": self.steps,
+            "duration_s": round(self.finished_at - self.started_at, 3) if self.finished_at else None,
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,40 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Bounded pools for the blocking stages of a request, sized independently so a
+# burst of slow LLM calls cannot starve database work (and vice versa).
+POOL_SIZES = {
+    "llm": int(os.getenv("LLM_WORKERS", "16")),  # OpenAI chat / embedding calls
+    "db": int(os.getenv("DB_WORKERS", "20")),  # Matches the engine pool_size
+    "cpu": int(os.getenv("CPU_WORKERS", "4")),  # DataFrame building, formatting, charts
+}
+
+_pools = {}
+
+
+def get_pool(name: str) -> ThreadPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        pool = _pools[name] = ThreadPoolExecutor(max_workers=POOL_SIZES[name], thread_name_prefix=f"{name}-worker")
+    return pool
+
+
+async def run_blocking(pool: str, func, *args, **kwargs):
+    """Run a blocking callable on the named worker pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context (request timings) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_pool(pool), functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_pools(wait: bool = False):
+    for name, pool in list(_pools.items()):
+        pool.shutdown(wait=wait)
+        del _pools[name]
+    logger.info("Worker pools shut down")
@@ -108,7 +108,16 @@
           name: "",
           userId: uid,
           ...(data.query && { query: data.query }),
-          ...(data.chart && { chart: data.chart })
+          ...(data.chart && { chart: data.chart }),
+          // Chart specs carry one typed array per axis; ChartRenderer draws {name, value} rows
+          ...(data.chart_spec && {
+            chartData: JSON.stringify(
+              data.chart_spec.data.x.map((name: unknown, i: number) => ({
+                name,
+                value: data.chart_spec.data.y[i],
+              }))
+            ),
+          })
         };
 
         // Add AI message to UI
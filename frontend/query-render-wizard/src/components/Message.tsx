@@ -18,6 +18,7 @@ interface MessageProps {
   format?: string;
   query?: string;
   chart?: string;
+  chartData?: string;
 }
 
 const Message: React.FC<MessageProps> = ({
@@ -28,6 +29,7 @@ const Message: React.FC<MessageProps> = ({
   format,
   query,
   chart,
+  chartData,
 }) => {
   const { user } = useAuth();
 
@@ -196,6 +198,21 @@ const Message: React.FC<MessageProps> = ({
         );
       }
 
+      if (format?.includes("chart") && chartData && !chart) {
+        return (
+          <div className="space-y-4 w-full max-w-4xl">
+            <ChartRenderer chartData={chartData} chartType={format} />
+            {query && (
+              <div className="mt-4 pt-3 border-t border-gray-100 dark:border-gray-700">
+                <p className="text-sm text-gray-500 dark:text-gray-400 font-mono">
+                  Query: {query}
+                </p>
+              </div>
+            )}
+          </div>
+        );
+      }
+
       if (format?.includes("chart") && chart) {
         return (
           <div className="space-y-4 w-full max-w-4xl">
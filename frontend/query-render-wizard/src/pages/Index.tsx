@@ -18,6 +18,7 @@ interface Message {
   format?: string;
   query?: string;
   chart?: string;
+  chartData?: string;
   createdAt?: any;
   userId?: string;
 }
@@ -73,6 +74,7 @@ const Index = () => {
               format: data.format,
               query: data.query,
               chart: data.chart,
+              chartData: data.chartData,
               createdAt: data.createdAt,
               userId: data.uid || data.userId
             });